@@ -0,0 +1,225 @@
+# asyncio front end: lex and parse a document from an asyncio.StreamReader (a socket, a pipe, a subprocess) while its
+# bytes arrive, without having the whole payload first and without blocking the event loop.
+# async for token in StreamTokens(reader):           # tokens as they are lexed
+#     ...
+# root = await parse_stream(reader)                  # AST and errors like parse_text
+# limiter = ParseLimiter(8)
+# root = await limiter.parse_stream(reader)         # at most 8 documents parsed at once
+# The bytes are lexed by a FastDFA (same tokens and errors as the DFA) whose stream is a Feed: when a token runs into
+# the end of the bytes received so far the lexer stops and the token is lexed again once more bytes are read.
+# The Parser runs Parser.value_steps and before every value waits until enough tokens are lexed for the next step, so
+# it stops in the middle of the document while the bytes are on the way and goes on where it stopped.
+# The document goes on to the end of the stream (the writer closes it), like the text given to parse_text.
+# Every YIELD_TOKENS tokens the event loop gets to run other tasks, also if the bytes are all there already.
+# python aio.py [file] sends the file (test_input_1.txt by default) through a local asyncio server in small pieces
+# and parses it from the connection.
+import asyncio
+import sys
+from collections import deque
+
+from diagnostics import Diagnostics
+from parser import Parser, MAX_STEP_TOKENS, error_file_name, write_tree
+from scanner import CHUNK_SIZE, FastDFA
+from tokens import TokenType
+
+# Tokens lexed before other tasks get to run
+YIELD_TOKENS = 256
+# Tokens lexed ahead of the parser once it has to wait anyway, fewer waits for a few more tokens in memory
+READ_AHEAD = 256
+# Documents parsed at the same time by a ParseLimiter by default
+MAX_PARSERS = 16
+
+
+# Raised by Feed.read when all bytes received so far were read and the stream is not at its end
+class MoreInput(Exception):
+	pass
+
+
+# Stream for the FastDFA with the bytes received so far
+class Feed:
+	def __init__(self):
+		self.chunks = deque()
+		self.closed = False
+
+	# Add bytes, empty bytes at the end of the stream
+	def add(self, data):
+		if data:
+			self.chunks.append(data)
+		else:
+			self.closed = True
+
+	def read(self, size):
+		if self.chunks:
+			return self.chunks.popleft()
+		if self.closed:
+			return b""
+		raise MoreInput()
+
+
+# Tokens of the bytes from reader, lexed as they are needed. Async iterator of the tokens, and a plain iterator
+# over the tokens lexed so far for the Parser.
+# The lexer is ahead of the parser, its errors are kept with the tokens and only added to diagnostics when the token
+# after them is taken, so they are in the same order as when the parser takes every token straight from the lexer.
+class StreamTokens:
+	# Lexer errors are recorded in diagnostics and string values interned in symbols, see FastDFA
+	def __init__(self, reader, chunk_size=CHUNK_SIZE, diagnostics=None, symbols=None):
+		self.reader = reader
+		self.chunk_size = chunk_size
+		self.diagnostics = diagnostics if diagnostics is not None else Diagnostics()
+		self.feed = Feed()
+		self.pending = Diagnostics(quiet=True)
+		self.lexer = FastDFA(stream=self.feed, chunk_size=chunk_size, diagnostics=self.pending, symbols=symbols)
+		self.buffer = deque()
+		# Number of lexer errors recorded before every token in the buffer, and of those already added to diagnostics
+		self.marks = deque()
+		self.reported = 0
+		# Set once the lexer is at the end of the stream
+		self.done = False
+		self.lexed = 0
+
+	# Lex until count tokens are waiting or the stream is at its end
+	async def fill(self, count):
+		buffer = self.buffer
+		lexer = self.lexer
+		while len(buffer) < count and not self.done:
+			try:
+				token = lexer.get_next_token()
+			except MoreInput:
+				self.feed.add(await self.reader.read(self.chunk_size))
+				continue
+			# Failed recognitions are dropped, same as DFA.iter_tokens
+			if not token:
+				continue
+			if token.type == TokenType.EOF:
+				self.done = True
+				break
+			buffer.append(token)
+			self.marks.append(len(self.pending.entries))
+			self.lexed += 1
+			if self.lexed % YIELD_TOKENS == 0:
+				await asyncio.sleep(0)
+
+	# Next token of the buffer with its lexer errors, None at the end of the buffer (with the errors after the last token
+	# if the stream is at its end)
+	def take(self):
+		if self.buffer:
+			token = self.buffer.popleft()
+			self.report(self.marks.popleft())
+			return token
+		if self.done:
+			self.report(len(self.pending.entries))
+		return None
+
+	def report(self, mark):
+		entries = self.pending.entries
+		for i in range(self.reported, mark):
+			self.diagnostics.add(entries[i])
+		self.reported = mark
+		if mark == len(entries) and not self.buffer:
+			entries.clear()
+			self.pending.emitted = 0
+			self.reported = 0
+
+	def __aiter__(self):
+		return self
+
+	async def __anext__(self):
+		if not self.buffer:
+			await self.fill(1)
+		token = self.take()
+		if token is None:
+			self.diagnostics.flush()
+			raise StopAsyncIteration
+		return token
+
+	def __iter__(self):
+		return self
+
+	def __next__(self):
+		token = self.take()
+		if token is None:
+			raise StopIteration
+		return token
+
+
+# Parse the document from reader, returns the AST. The arguments are those of parser.parse_text.
+async def parse_stream(reader, file_name="", compact=False, max_depth=None, diagnostics=None, chunk_size=CHUNK_SIZE, symbols=None):
+	shared = diagnostics if diagnostics is not None else Diagnostics()
+	tokens = StreamTokens(reader, chunk_size, shared, symbols)
+	theParser = Parser(file_name, tokens, compact, max_depth, shared)
+	try:
+		# Same as Parser.parse, the tokens for the next step are lexed before every value
+		await tokens.fill(1)
+		theParser.get_next_token()
+		steps = theParser.value_steps()
+		while True:
+			try:
+				needed = next(steps) + MAX_STEP_TOKENS
+			except StopIteration as done:
+				# Same as Parser.parse, the rest of the stream is lexed for its errors
+				async for _ in tokens:
+					pass
+				return done.value
+			if len(tokens.buffer) < needed and not tokens.done:
+				await tokens.fill(needed + READ_AHEAD)
+	finally:
+		if diagnostics is None:
+			shared.close()
+		else:
+			shared.flush()
+
+
+# Limits how many documents are parsed at the same time, e.g. one per connection of a server. The others wait for
+# their turn before anything is read from their reader.
+class ParseLimiter:
+	def __init__(self, max_parsers=MAX_PARSERS):
+		self.max_parsers = max_parsers
+		self.semaphore = asyncio.Semaphore(max_parsers)
+		# Documents being parsed and waiting
+		self.active = 0
+		self.waiting = 0
+
+	# parse_stream once there is room
+	async def parse_stream(self, reader, *arguments, **options):
+		self.waiting += 1
+		try:
+			await self.semaphore.acquire()
+		finally:
+			self.waiting -= 1
+		self.active += 1
+		try:
+			return await parse_stream(reader, *arguments, **options)
+		finally:
+			self.active -= 1
+			self.semaphore.release()
+
+
+# Stand-in server that writes text in pieces of size characters with a pause in between and closes the connection
+async def serve_slowly(text, size=16, pause=0.001):
+	data = text.encode("utf-8")
+
+	async def send(reader, writer):
+		for start in range(0, len(data), size):
+			writer.write(data[start:start + size])
+			await writer.drain()
+			await asyncio.sleep(pause)
+		writer.close()
+		await writer.wait_closed()
+	return await asyncio.start_server(send, "127.0.0.1", 0)
+
+
+async def main(file_name):
+	with open(file_name, "r") as file:
+		server = await serve_slowly(file.read())
+	async with server:
+		reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+		root = await parse_stream(reader, file_name)
+		writer.close()
+	output_file_name = file_name[0:-4] + "_AST_output.txt"
+	with open(output_file_name, "w") as output_file:
+		write_tree(root, output_file, True)
+	print(f"------ {file_name} parsed from a socket, errors in {error_file_name(file_name)} ------")
+
+
+if __name__ == "__main__":
+	asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else "test_input_1.txt"))
@@ -0,0 +1,138 @@
+# Batch mode: scan, parse and check many files at once, spread over a process pool.
+# For every input file <name>.txt the errors go to <name>_errors.txt (same as Parser) and the AST to <name>_AST_output.txt.
+# python batch.py <directory or glob> [--workers N] [--fast] [--indexed] [--compact] [--max-depth N] [--max-errors N] [--profile]
+# --profile also writes <name>_AST_output_profile.json with the profiling report of every file
+# A directory means every *.txt file in it and a glob every file it matches, except the output files written by an earlier
+# run of batch.py, parser.py or scanner.py (see OUTPUT_PATTERNS).
+import argparse
+import fnmatch
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from diagnostics import Diagnostics, SEMANTIC
+from parser import Parser, write_tree
+from profiling import Profile, report_file_name
+from scanner import tokenize_file
+
+# Names of the files written by batch.py, parser.py and scanner.py (error files, ASTs, token dumps, profiling reports)
+OUTPUT_PATTERNS = ("*_errors.txt", "*_AST_output.txt", "test_AST_output_*.txt", "test_input_parser_*.txt", "*.tok", "*_profile.json")
+
+
+# Result of one file
+class FileResult:
+	def __init__(self, file_name, semantic_errors=0, other_errors=0, failure=None, seconds=0.0):
+		self.file_name = file_name
+		# Semantic errors written to the error file, and lexer/parser errors
+		self.semantic_errors = semantic_errors
+		self.other_errors = other_errors
+		# Message of the exception that stopped the file, None if it was parsed
+		self.failure = failure
+		self.seconds = seconds
+
+
+# Input files for a directory or glob, sorted so that runs are repeatable
+def find_files(pattern):
+	if os.path.isdir(pattern):
+		pattern = os.path.join(pattern, "*.txt")
+	return sorted(name for name in glob.glob(pattern) if os.path.isfile(name) and not is_output_file(name))
+
+
+def is_output_file(file_name):
+	base_name = os.path.basename(file_name)
+	return any(fnmatch.fnmatch(base_name, output) for output in OUTPUT_PATTERNS)
+
+
+# Name of the AST output file for an input file
+def ast_file_name(file_name):
+	return os.path.splitext(file_name)[0] + "_AST_output.txt"
+
+
+# Scan, parse and check one file and write its outputs. Runs in the worker processes.
+def process_file(file_name, fast=False, compact=False, max_depth=None, max_errors=None, profiling=False, indexed=False):
+	start = time.perf_counter()
+	# Errors are only counted and written to the error file, not printed
+	diagnostics = Diagnostics(quiet=True, max_errors=max_errors)
+	profile = Profile() if profiling else None
+	try:
+		tokens = tokenize_file(file_name, fast=fast, diagnostics=diagnostics, profile=profile, indexed=indexed)
+		theParser = Parser(file_name, tokens, compact, max_depth, diagnostics)
+		if profile is not None:
+			profile.attach_parser(theParser)
+		root = theParser.parse()
+		with open(ast_file_name(file_name), "w") as output_file:
+			if profile is not None:
+				with profile.phase("output"):
+					write_tree(root, output_file)
+			else:
+				write_tree(root, output_file)
+		if profile is not None:
+			profile.write_report(report_file_name(ast_file_name(file_name)))
+		failure = None
+	except Exception as exception:
+		failure = f"{type(exception).__name__}: {exception}"
+	finally:
+		diagnostics.close()
+	semantic_errors = diagnostics.count(SEMANTIC)
+	other_errors = len(diagnostics.entries) - semantic_errors
+	return FileResult(file_name, semantic_errors, other_errors, failure, time.perf_counter() - start)
+
+
+# Process all files with the given number of worker processes (1 runs them in this process).
+# Yields a FileResult per file, in the order of file_names.
+def run_batch(file_names, workers=None, fast=False, compact=False, max_depth=None, max_errors=None, profiling=False, indexed=False):
+	workers = workers or os.cpu_count() or 1
+	if workers == 1:
+		for file_name in file_names:
+			yield process_file(file_name, fast, compact, max_depth, max_errors, profiling, indexed)
+		return
+	# Hand out files in chunks so that small files don't spend most of their time in inter process communication
+	chunk_size = max(1, min(64, len(file_names) // (workers * 4)))
+	count = len(file_names)
+	with ProcessPoolExecutor(workers) as pool:
+		yield from pool.map(process_file, file_names, [fast] * count, [compact] * count, [max_depth] * count, [max_errors] * count, [profiling] * count, [indexed] * count, chunksize=chunk_size)
+
+
+# Print the totals of a batch run, returns the number of files that failed
+def print_summary(results, workers, seconds, out=sys.stdout):
+	with_errors = [result for result in results if result.failure is None and (result.semantic_errors or result.other_errors)]
+	failed = [result for result in results if result.failure is not None]
+	print(f"Processed {len(results)} files in {seconds:.2f}s with {workers} workers", file=out)
+	print(f"  OK: {len(results) - len(with_errors) - len(failed)}, with errors: {len(with_errors)}, failed: {len(failed)}", file=out)
+	print(f"  Semantic errors: {sum(result.semantic_errors for result in results)}, "
+		f"lexer/parser errors: {sum(result.other_errors for result in results)}", file=out)
+	if results:
+		slowest = max(results, key=lambda result: result.seconds)
+		print(f"  Slowest file: {slowest.file_name} ({slowest.seconds:.3f}s)", file=out)
+	for result in failed:
+		print(f"  FAILED {result.file_name}: {result.failure}", file=out)
+	return len(failed)
+
+
+def main(argv=None):
+	arguments = argparse.ArgumentParser(description="Scan, parse and check many files in parallel")
+	arguments.add_argument("path", help="directory (all *.txt files in it) or glob pattern of the input files")
+	arguments.add_argument("--workers", type=int, default=None, help="number of worker processes (default: number of cores)")
+	arguments.add_argument("--fast", action="store_true", help="use the FastDFA lexer")
+	arguments.add_argument("--indexed", action="store_true", help="use the IndexedDFA lexer (needs numpy)")
+	arguments.add_argument("--compact", action="store_true", help="build the AST out of CompactNodes")
+	arguments.add_argument("--max-depth", type=int, default=None, help="maximum nesting depth of dicts and lists")
+	arguments.add_argument("--max-errors", type=int, default=None, help="stop recording errors of a file after this many")
+	arguments.add_argument("--profile", action="store_true", help="write a profiling report next to every AST output")
+	options = arguments.parse_args(argv)
+	
+	file_names = find_files(options.path)
+	if not file_names:
+		print("No input files found for " + options.path)
+		return 1
+	workers = options.workers or os.cpu_count() or 1
+	start = time.perf_counter()
+	results = list(run_batch(file_names, workers, options.fast, options.compact, options.max_depth, options.max_errors, options.profile, options.indexed))
+	failed = print_summary(results, workers, time.perf_counter() - start)
+	return 1 if failed else 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
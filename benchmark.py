@@ -0,0 +1,300 @@
+# Benchmarks for the scanner, parser and output stages on generated documents.
+# python benchmark.py [--size BYTES] [--depth N] [--width N] [--string-length N] [--number-density P] [--error-rate P]
+#                     [--seed N] [--repeat N] [--stages a,b,...] [--output FILE] [--compare FILE] [--threshold P]
+# Every stage is timed on its own (best of --repeat runs) and reported in MB/s of input and tokens/s, with the peak memory
+# allocated while it runs. The stdlib json module is timed on the same document as a baseline.
+# The results are saved as JSON, --compare checks them against an earlier results file and exits with 1 if a stage
+# got slower by more than --threshold.
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import string
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from diagnostics import Diagnostics, SEMANTIC
+from events import EventHandler, parse_events
+from native import parse_native
+from parser import Parser, tokenize, read_binary_tokens, write_tree
+from profiling import CHECK_METHODS, Profile
+from scanner import DFA, FastDFA, IndexedDFA, write_binary_tokens
+
+RESULTS_VERSION = 1
+# Stages that are part of a larger run and return their own time (and a result)
+SELF_TIMED_STAGES = ("semantic_checks",)
+
+# Injected errors, one is picked for every leaf that gets an error: reserved and empty keys, numbers with leading
+# zeros or missing digits around the decimal point, and characters the lexer does not know
+ERROR_KEYS = ['"true"', '""', '"null"']
+ERROR_NUMBERS = ["012", "+5", ".5", "5."]
+ERROR_CHARACTERS = ["@", "#", "$"]
+
+
+# Settings of a generated document
+class DocumentConfig:
+	def __init__(self, size=1000000, depth=4, width=5, string_length=8, number_density=0.3, error_rate=0.0, seed=0):
+		# Approximate size in characters
+		self.size = size
+		# Nesting depth of every record in the top level list, and number of items in every dict and list
+		self.depth = depth
+		self.width = width
+		self.string_length = string_length
+		# Fraction of the leaves that are numbers
+		self.number_density = number_density
+		# Fraction of the leaves (and dict keys) that get an error
+		self.error_rate = error_rate
+		self.seed = seed
+
+	def to_dict(self):
+		return dict(vars(self))
+
+
+# Generate a document: a list of records, every record is a chain of dicts and lists nested config.depth deep.
+# Every container has config.width items, one of them is the next container of the chain and the others are leaves.
+# The random draws don't depend on error_rate, so the same seed with error_rate 0 gives the same document without errors.
+def generate_document(config):
+	rng = random.Random(config.seed)
+	parts = ["["]
+	length = 1
+	while length < config.size:
+		record = generate_record(rng, config)
+		if len(parts) > 1:
+			record = ",\n" + record
+		parts.append(record)
+		length += len(record)
+	parts.append("]\n")
+	return "".join(parts)
+
+
+# One record, built without recursion so that deep records can be generated
+def generate_record(rng, config):
+	opening = []
+	closing = []
+	for level in range(config.depth):
+		is_dict = rng.random() < 0.5
+		position = rng.randrange(config.width)
+		items = [generate_item(rng, config, is_dict) for _ in range(config.width - 1)]
+		nested_key = generate_key(rng, config) + ": " if is_dict else ""
+		before = items[:position]
+		after = items[position:]
+		opening.append(("{" if is_dict else "[") + "".join(item + ", " for item in before) + nested_key)
+		closing.append("".join(", " + item for item in after) + ("}" if is_dict else "]"))
+	leaf = generate_leaf(rng, config)
+	return "".join(opening) + leaf + "".join(reversed(closing))
+
+
+def generate_item(rng, config, is_dict):
+	if is_dict:
+		return generate_key(rng, config) + ": " + generate_leaf(rng, config)
+	return generate_leaf(rng, config)
+
+
+def generate_key(rng, config):
+	key = generate_string(rng, config)
+	error = rng.random() < config.error_rate
+	variant = rng.random()
+	if error:
+		return ERROR_KEYS[int(variant * len(ERROR_KEYS))]
+	return key
+
+
+def generate_string(rng, config):
+	return '"' + "".join(rng.choices(string.ascii_letters, k=config.string_length)) + '"'
+
+
+def generate_leaf(rng, config):
+	choice = rng.random()
+	error = rng.random() < config.error_rate
+	variant = rng.random()
+	if choice < config.number_density:
+		if rng.random() < 0.5:
+			leaf = str(rng.randrange(1, 1000000))
+		else:
+			leaf = f"{rng.randrange(1, 1000)}.{rng.randrange(1000)}"
+		if error:
+			return ERROR_NUMBERS[int(variant * len(ERROR_NUMBERS))]
+		return leaf
+	if choice < config.number_density + (1 - config.number_density) * 0.1:
+		leaf = rng.choice(["true", "false", "null"])
+	else:
+		leaf = generate_string(rng, config)
+	if error:
+		return ERROR_CHARACTERS[int(variant * len(ERROR_CHARACTERS))] + leaf
+	return leaf
+
+
+# Parse tokens with the check methods of the parser timed by a Profile, returns the time spent in the checks and the
+# diagnostics. The checks are those of a real parse, called from the grammar methods as usual.
+def time_semantic_checks(tokens):
+	profile = Profile()
+	theParser = Parser(tokens=tokens, diagnostics=Diagnostics(quiet=True))
+	for name in CHECK_METHODS:
+		profile.wrap(theParser, name, name)
+	theParser.parse()
+	return sum(profile.seconds.values()), theParser.diagnostics
+
+
+# Best time of repeat runs of function, and its result
+def measure(function, repeat):
+	best = None
+	result = None
+	for _ in range(repeat):
+		result = None
+		gc.collect()
+		start = time.perf_counter()
+		result = function()
+		seconds = time.perf_counter() - start
+		if best is None or seconds < best:
+			best = seconds
+	return best, result
+
+
+# Peak memory allocated while function runs
+def peak_memory(function):
+	gc.collect()
+	tracemalloc.start()
+	try:
+		function()
+		return tracemalloc.get_traced_memory()[1]
+	finally:
+		tracemalloc.stop()
+
+
+# Run the benchmark, returns the results as a dict (the content of the results file)
+def run_benchmark(config, repeat=3, stages=None, out=sys.stdout):
+	text = generate_document(config)
+	clean_text = text if config.error_rate == 0 else generate_document(DocumentConfig(**{**config.to_dict(), "error_rate": 0}))
+	input_bytes = len(text.encode("utf-8"))
+	tokens = DFA(text, Diagnostics(quiet=True)).tokenize()
+	with tempfile.TemporaryDirectory() as directory:
+		token_file = os.path.join(directory, "tokens.txt")
+		binary_file = os.path.join(directory, "tokens.tok")
+		tree_file = os.path.join(directory, "tree.txt")
+		write_binary_tokens(tokens, binary_file)
+		root = Parser(tokens=tokens, diagnostics=Diagnostics(quiet=True)).parse()
+		clean_value = json.loads(clean_text)
+
+		def write_token_file():
+			with open(token_file, "w") as file:
+				for token in tokens:
+					print(token, file=file)
+
+		def read_token_file():
+			result = []
+			with open(token_file, "r") as file:
+				for line in file:
+					if line != '\n':
+						result.extend(tokenize(line))
+			return result
+
+		def write_tree_file():
+			with open(tree_file, "w") as file:
+				write_tree(root, file)
+
+		write_token_file()
+		all_stages = {
+			"scan_dfa": lambda: DFA(text, Diagnostics(quiet=True)).tokenize(),
+			"scan_fast": lambda: FastDFA(text, diagnostics=Diagnostics(quiet=True)).tokenize(),
+			"scan_indexed": lambda: IndexedDFA(text, diagnostics=Diagnostics(quiet=True)).tokenize(),
+			"token_file_write": write_token_file,
+			"token_file_read": read_token_file,
+			"binary_write": lambda: write_binary_tokens(tokens, binary_file),
+			"binary_read": lambda: list(read_binary_tokens(binary_file)),
+			"parse": lambda: Parser(tokens=tokens, diagnostics=Diagnostics(quiet=True)).parse(),
+			"parse_compact": lambda: Parser(tokens=tokens, compact=True, diagnostics=Diagnostics(quiet=True)).parse(),
+			"parse_events": lambda: parse_events(tokens, EventHandler(), diagnostics=Diagnostics(quiet=True)),
+			"parse_native": lambda: parse_native(tokens, diagnostics=Diagnostics(quiet=True)),
+			"semantic_checks": lambda: time_semantic_checks(tokens),
+			"write_tree": write_tree_file,
+			"json_loads": lambda: json.loads(clean_text),
+			"json_dumps": lambda: json.dumps(clean_value, indent=3),
+		}
+		results = {
+			"version": RESULTS_VERSION,
+			"python": platform.python_version(),
+			"platform": platform.platform(),
+			"config": config.to_dict(),
+			"repeat": repeat,
+			"input_bytes": input_bytes,
+			"tokens": len(tokens),
+			"errors": sum(entry.source == SEMANTIC for entry in time_semantic_checks(tokens)[1].entries),
+			"stages": {},
+		}
+		print(f"Document: {input_bytes} bytes, {len(tokens)} tokens", file=out)
+		for name, function in all_stages.items():
+			if stages is not None and name not in stages:
+				continue
+			if name in SELF_TIMED_STAGES:
+				seconds = min(function()[0] for _ in range(repeat))
+			else:
+				seconds, _ = measure(function, repeat)
+			peak = peak_memory(function)
+			results["stages"][name] = {
+				"seconds": seconds,
+				"mb_per_s": input_bytes / seconds / 1e6,
+				"tokens_per_s": len(tokens) / seconds,
+				"peak_bytes": peak,
+			}
+			print(f"  {name:<18}{seconds:10.4f}s{input_bytes / seconds / 1e6:10.2f} MB/s"
+				f"{len(tokens) / seconds:14.0f} tokens/s{peak / 1e6:10.1f} MB peak", file=out)
+	return results
+
+
+# Compare results against earlier results, returns the stages that got slower by more than threshold
+def compare_results(results, previous, threshold=0.1, out=sys.stdout):
+	if previous.get("config") != results["config"]:
+		print("Warning: the document settings differ from the earlier results", file=out)
+	regressions = []
+	for name, stage in results["stages"].items():
+		before = previous.get("stages", {}).get(name)
+		if before is None:
+			continue
+		ratio = stage["seconds"] / before["seconds"]
+		marker = ""
+		if ratio > 1 + threshold:
+			marker = "  SLOWER"
+			regressions.append(name)
+		print(f"  {name:<18}{before['seconds']:10.4f}s ->{stage['seconds']:10.4f}s  x{ratio:.2f}{marker}", file=out)
+	return regressions
+
+
+def main(argv=None):
+	arguments = argparse.ArgumentParser(description="Benchmark the scanner, parser and output stages")
+	defaults = DocumentConfig()
+	arguments.add_argument("--size", type=int, default=defaults.size, help="approximate document size in characters")
+	arguments.add_argument("--depth", type=int, default=defaults.depth, help="nesting depth of every record")
+	arguments.add_argument("--width", type=int, default=defaults.width, help="number of items in every dict and list")
+	arguments.add_argument("--string-length", type=int, default=defaults.string_length, help="length of strings and keys")
+	arguments.add_argument("--number-density", type=float, default=defaults.number_density, help="fraction of leaves that are numbers")
+	arguments.add_argument("--error-rate", type=float, default=defaults.error_rate, help="fraction of leaves and keys with an error")
+	arguments.add_argument("--seed", type=int, default=defaults.seed)
+	arguments.add_argument("--repeat", type=int, default=3, help="runs per stage, the best one is reported")
+	arguments.add_argument("--stages", default=None, help="comma separated stages to run (default: all)")
+	arguments.add_argument("--output", default="bench_output.json", help="results file")
+	arguments.add_argument("--compare", default=None, help="earlier results file to compare against")
+	arguments.add_argument("--threshold", type=float, default=0.1, help="slowdown that counts as a regression")
+	options = arguments.parse_args(argv)
+
+	config = DocumentConfig(options.size, options.depth, options.width, options.string_length,
+		options.number_density, options.error_rate, options.seed)
+	stages = options.stages.split(",") if options.stages else None
+	results = run_benchmark(config, options.repeat, stages)
+	with open(options.output, "w") as file:
+		json.dump(results, file, indent=2)
+	print("Results written to " + options.output)
+	if options.compare:
+		with open(options.compare, "r") as file:
+			previous = json.load(file)
+		print("Compared with " + options.compare)
+		if compare_results(results, previous, options.threshold):
+			return 1
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
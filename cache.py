@@ -0,0 +1,235 @@
+# Parse cache keyed by a hash of the input.
+# ParseCache.parse_text and ParseCache.parse_file scan and parse like parser.parse_text/parse_file, and keep the
+# token stream, the AST and the diagnostics of the input under the sha256 of its bytes (and the parse options).
+# Parsing the same input again returns the stored results without lexing or parsing; the stored diagnostics are
+# added to the Diagnostics again, so the console output and the error file are the same as for a fresh parse.
+# Entries are kept in memory in LRU order within a byte budget, and optionally pickled to a directory that is
+# still there after a restart. The results of a hit are shared with the cache and should not be modified. The string
+# values of the kept tokens are interned (see scanner.SymbolTable), so repeated keys are stored once.
+# Unpickling a file can run any code, so the directory must be private to the user running the cache: it is created
+# with mode 0o700, an existing one that others can write to is refused, and every file carries an HMAC of its content
+# (keyed with a secret kept in the directory, or passed in) that is checked before it is unpickled.
+import hashlib
+import hmac
+import os
+import pickle
+from collections import OrderedDict
+
+from diagnostics import Diagnostics
+from parser import parse_tokens, error_file_name
+from scanner import CHUNK_SIZE, SymbolTable, make_lexer, stream_lexer
+
+# Part of every key, change it when the stored objects change so that old files on disk are not used
+CACHE_VERSION = 3
+# Default memory budget
+MAX_BYTES = 64 * 1024 * 1024
+# Start of every file on disk, followed by the HMAC-SHA256 of the key and the pickled data
+DISK_MAGIC = b"PARSECACHE\n"
+SIGNATURE_BYTES = 32
+# File in the directory with the secret of the HMACs
+SECRET_FILE = "cache.key"
+
+
+# What is stored for one input
+class CachedParse:
+	def __init__(self, tokens, root, entries):
+		# Every token of the input, the AST and the Diagnostic entries recorded while parsing it
+		self.tokens = tokens
+		self.root = root
+		self.entries = entries
+
+
+class ParseCache:
+	# max_bytes is the memory budget (sizes are those of the pickled entries),
+	# directory is where entries are also stored on disk (None to only keep them in memory), it must be private (see above).
+	# secret is the key of the HMACs of the files, by default a random one kept in the directory.
+	def __init__(self, max_bytes=MAX_BYTES, directory=None, secret=None):
+		self.max_bytes = max_bytes
+		self.directory = directory
+		self.secret = secret
+		if directory is not None:
+			private_directory(directory)
+			if secret is None:
+				self.secret = directory_secret(directory)
+		# key -> (CachedParse, size), least recently used first
+		self.entries = OrderedDict()
+		self.size = 0
+		self.hits = 0
+		self.disk_hits = 0
+		self.misses = 0
+		self.evictions = 0
+		# Results that could not be stored (pickle gives up on very deep trees)
+		self.uncacheable = 0
+		# Files on disk that were not unpickled because their HMAC did not match
+		self.rejected = 0
+
+	def stats(self):
+		return {
+			"hits": self.hits,
+			"disk_hits": self.disk_hits,
+			"misses": self.misses,
+			"evictions": self.evictions,
+			"uncacheable": self.uncacheable,
+			"rejected": self.rejected,
+			"entries": len(self.entries),
+			"bytes": self.size,
+		}
+
+	# Scan and parse input_text (see parser.parse_text), returns a CachedParse
+	def parse_text(self, input_text, file_name="", fast=False, compact=False, max_depth=None, diagnostics=None):
+		key = self.key(hashlib.sha256(input_text.encode("utf-8")), compact, max_depth)
+		return self.parse(key, lambda shared: make_lexer(input_text, fast, shared, symbols=SymbolTable()), file_name, compact, max_depth, diagnostics)
+
+	# Scan and parse a file (see parser.parse_file), returns a CachedParse. Errors are written to <file>_errors.txt
+	def parse_file(self, file_name, fast=False, compact=False, max_depth=None, diagnostics=None):
+		digest = hashlib.sha256()
+		with open(file_name, "rb") as file:
+			for block in iter(lambda: file.read(CHUNK_SIZE), b""):
+				digest.update(block)
+		key = self.key(digest, compact, max_depth)
+		with open(file_name, "r") as file:
+			return self.parse(key, lambda shared: stream_lexer(file, CHUNK_SIZE, fast, shared, symbols=SymbolTable()), file_name, compact, max_depth, diagnostics)
+
+	def key(self, digest, compact, max_depth):
+		return f"{digest.hexdigest()}-{CACHE_VERSION}-{int(compact)}-{max_depth}"
+
+	# Look the key up, parse with the lexer from new_lexer(diagnostics) if it is not there
+	def parse(self, key, new_lexer, file_name, compact, max_depth, diagnostics):
+		shared = diagnostics if diagnostics is not None else Diagnostics()
+		try:
+			result = self.get(key)
+			if result is not None:
+				# Same output as parsing: the error file is opened like Parser does and the errors are reported again
+				if file_name and shared.error_file is None:
+					shared.error_file = open(error_file_name(file_name), "w")
+				for entry in result.entries:
+					shared.add(entry)
+				shared.flush()
+				return result
+			self.misses += 1
+			result = self.run(new_lexer(shared), file_name, compact, max_depth, shared)
+			self.put(key, result)
+			return result
+		finally:
+			if diagnostics is None:
+				shared.close()
+
+	# Scan and parse, keeping every token
+	def run(self, lexer, file_name, compact, max_depth, shared):
+		start = len(shared.entries)
+		tokens = []
+
+		def collect():
+			for token in lexer.iter_tokens():
+				tokens.append(token)
+				yield token
+		# The parser reads the tokens after the document as well
+		root = parse_tokens(collect(), file_name, "", compact, max_depth, shared)
+		return CachedParse(tokens, root, shared.entries[start:])
+
+	def get(self, key):
+		if key in self.entries:
+			self.entries.move_to_end(key)
+			self.hits += 1
+			return self.entries[key][0]
+		data = self.read_disk(key)
+		if data is None:
+			return None
+		result = pickle.loads(data)
+		self.hits += 1
+		self.disk_hits += 1
+		self.remember(key, result, len(data))
+		return result
+
+	def put(self, key, result):
+		try:
+			data = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+		except RecursionError:
+			self.uncacheable += 1
+			return
+		self.remember(key, result, len(data))
+		self.write_disk(key, data)
+
+	# Keep a result in memory, evicting the least recently used ones to stay within max_bytes
+	def remember(self, key, result, size):
+		if size > self.max_bytes:
+			return
+		self.entries[key] = (result, size)
+		self.size += size
+		while self.size > self.max_bytes:
+			_, (_, evicted_size) = self.entries.popitem(last=False)
+			self.size -= evicted_size
+			self.evictions += 1
+
+	def disk_path(self, key):
+		return os.path.join(self.directory, key + ".pickle")
+
+	# HMAC of a file, the key is part of it so that a file is only valid under its own name
+	def signature(self, key, data):
+		return hmac.new(self.secret, key.encode("ascii") + b"\0" + data, hashlib.sha256).digest()
+
+	# Pickled data of a file, None if there is none or it is not signed with the secret (it is overwritten then)
+	def read_disk(self, key):
+		if self.directory is None:
+			return None
+		try:
+			with open(self.disk_path(key), "rb") as file:
+				content = file.read()
+		except FileNotFoundError:
+			return None
+		start = len(DISK_MAGIC) + SIGNATURE_BYTES
+		data = content[start:]
+		if not content.startswith(DISK_MAGIC) or not hmac.compare_digest(content[len(DISK_MAGIC):start], self.signature(key, data)):
+			self.rejected += 1
+			return None
+		return data
+
+	def write_disk(self, key, data):
+		if self.directory is None:
+			return
+		# Write to a temporary file first so that other processes never see half a file
+		path = self.disk_path(key)
+		temporary = f"{path}.{os.getpid()}.tmp"
+		with open(temporary, "wb") as file:
+			file.write(DISK_MAGIC)
+			file.write(self.signature(key, data))
+			file.write(data)
+		os.replace(temporary, path)
+
+	# Empty the memory cache, and the disk store as well if disk is True
+	def clear(self, disk=False):
+		self.entries.clear()
+		self.size = 0
+		if disk and self.directory is not None:
+			for name in os.listdir(self.directory):
+				if name.endswith(".pickle"):
+					os.remove(os.path.join(self.directory, name))
+
+
+# Create directory readable and writable only by the current user. An existing directory must belong to the current user
+# and not be writable by others (on POSIX systems), anyone who can put files there could run code through pickle.
+def private_directory(directory):
+	os.makedirs(directory, mode=0o700, exist_ok=True)
+	if os.name == "posix":
+		status = os.stat(directory)
+		if status.st_uid != os.getuid() or status.st_mode & 0o022:
+			raise Exception(f"Cache directory {directory} must belong to the current user and must not be writable by others")
+
+
+# Secret of the HMACs of the files in directory, a random one is created (readable only by the current user) the first time
+def directory_secret(directory):
+	path = os.path.join(directory, SECRET_FILE)
+	if not os.path.exists(path):
+		temporary = f"{path}.{os.getpid()}.tmp"
+		descriptor = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+		with os.fdopen(descriptor, "wb") as file:
+			file.write(os.urandom(SIGNATURE_BYTES))
+		# Another process may have created it in the meantime, the first one is kept
+		try:
+			os.link(temporary, path)
+		except FileExistsError:
+			pass
+		finally:
+			os.remove(temporary)
+	with open(path, "rb") as file:
+		return file.read()
@@ -0,0 +1,123 @@
+# Client of the parse server (server.py). It only needs the standard library, so starting it is quick.
+# with ParseClient() as client:                  # or ParseClient("/tmp/parser.sock") for a Unix socket
+#     response = client.parse(text)             # {"ok": True, "ast": "...", "messages": [...], "counts": {...}}
+#     responses = client.request_many("validate", texts)
+# python client.py [--socket PATH | --host HOST --port N] [--fast] [--indexed] [--compact] [--max-depth N] [--max-errors N] scan|parse|validate FILE...
+# python client.py [--socket PATH | --host HOST --port N] stats
+# scan prints the tokens and parse the AST like scanner.py and parser.py, all three print the error messages.
+# The exit status is 1 if a request failed, or for validate if a file has errors.
+import argparse
+import json
+import socket
+import sys
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 7654
+
+
+# Connection to a server at address, a path for a Unix socket or (host, port)
+class ParseClient:
+	def __init__(self, address=(DEFAULT_HOST, DEFAULT_PORT), timeout=None):
+		if isinstance(address, str):
+			self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		else:
+			self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self.socket.settimeout(timeout)
+		self.socket.connect(address)
+		self.reader = self.socket.makefile("rb")
+		self.next_id = 0
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exception):
+		self.close()
+
+	def close(self):
+		self.reader.close()
+		self.socket.close()
+
+	# Send one request and wait for its response. options are fast, compact, indexed, max_depth and max_errors.
+	def request(self, op, text=None, **options):
+		return self.request_many(op, [text], **options)[0]
+
+	# Send a request for every text and then read the responses, so that the server can batch them.
+	# Returns the responses in the order of texts.
+	def request_many(self, op, texts, **options):
+		ids = []
+		lines = []
+		for text in texts:
+			self.next_id += 1
+			ids.append(self.next_id)
+			request = {"id": self.next_id, "op": op, **options}
+			if text is not None:
+				request["text"] = text
+			lines.append(json.dumps(request) + "\n")
+		self.socket.sendall("".join(lines).encode("utf-8"))
+		# The server answers in the order the requests finish
+		responses = {}
+		while len(responses) < len(ids):
+			line = self.reader.readline()
+			if not line:
+				raise Exception("Connection to the parse server closed")
+			response = json.loads(line)
+			responses[response.get("id")] = response
+		return [responses[i] for i in ids]
+
+	def scan(self, text, **options):
+		return self.request("scan", text, **options)
+
+	def parse(self, text, **options):
+		return self.request("parse", text, **options)
+
+	def validate(self, text, **options):
+		return self.request("validate", text, **options)
+
+	# Queue depth, request counts and latency percentiles of the server
+	def stats(self):
+		return self.request("stats")
+
+
+def main(argv=None):
+	arguments = argparse.ArgumentParser(description="Scan, parse or validate files on a running parse server")
+	arguments.add_argument("op", choices=["scan", "parse", "validate", "stats"])
+	arguments.add_argument("files", nargs="*")
+	arguments.add_argument("--socket", help="Unix socket of the server")
+	arguments.add_argument("--host", default=DEFAULT_HOST)
+	arguments.add_argument("--port", type=int, default=DEFAULT_PORT)
+	arguments.add_argument("--fast", action="store_true", help="use the FastDFA lexer")
+	arguments.add_argument("--indexed", action="store_true", help="use the IndexedDFA lexer (needs numpy)")
+	arguments.add_argument("--compact", action="store_true", help="build the AST out of CompactNodes")
+	arguments.add_argument("--max-depth", type=int, default=None)
+	arguments.add_argument("--max-errors", type=int, default=None)
+	options = arguments.parse_args(argv)
+	address = options.socket if options.socket else (options.host, options.port)
+	with ParseClient(address) as client:
+		if options.op == "stats":
+			print(json.dumps(client.stats(), indent=3))
+			return 0
+		texts = []
+		for file_name in options.files:
+			with open(file_name, "r") as file:
+				texts.append(file.read())
+		responses = client.request_many(options.op, texts, fast=options.fast, indexed=options.indexed,
+			compact=options.compact, max_depth=options.max_depth, max_errors=options.max_errors)
+	status = 0
+	for file_name, response in zip(options.files, responses):
+		print("------ " + file_name + " ------")
+		for token in response.get("tokens", []):
+			print(token)
+		if "ast" in response:
+			sys.stdout.write(response["ast"])
+		for message in response["messages"]:
+			print(message)
+		if not response["ok"]:
+			print("Failed: " + response["error"])
+			status = 1
+		elif options.op == "validate" and sum(response["counts"].values()):
+			status = 1
+	return status
+
+
+if __name__ == "__main__":
+	sys.exit(main())
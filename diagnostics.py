@@ -0,0 +1,179 @@
+# Diagnostics collector shared by the scanner and the parser.
+# Lexer, parser and semantic errors are recorded as Diagnostic entries (code, level, position, token kind, ...) and only
+# formatted into the text messages when they are emitted. Pending entries are written out in batches: every message to
+# the console (unless quiet) and the semantic errors to the error file as well, the same text the scanner and parser
+# used to print one message at a time.
+import sys
+
+from tokens import TokenType
+
+# Where an entry comes from
+LEXER = "lexer"
+PARSER = "parser"
+SEMANTIC = "semantic"
+
+# Default number of entries collected before they are written out
+BUFFER_SIZE = 256
+
+# Lexer error codes, "S" (unterminated string) is recorded but was never printed by the scanner
+LEXER_MESSAGES = {
+	"C": "Invalid character '{character}' at position {position}",
+	"E": "Invalid string at position {position}, character {character}",
+	"B": "Invalid boolean (true/false/null) at position {position}, character: {character}",
+}
+LEXER_KINDS = {
+	"S": TokenType.STRING,
+	"E": TokenType.STRING,
+}
+
+# Parser error codes: what was being parsed when the error happened. "B" (true/false/null expected) is recorded but was
+# never printed by the parser.
+PARSER_CONTEXTS = {
+	"D": "in dictionary",
+	"L": "in list",
+	"P": "in pair",
+	"V": "as value",
+	"S": "as string",
+	"N": "as number",
+}
+# Parser error messages, filled in with the position in the token stream and the token
+PARSER_MESSAGES = {
+	"dict_comma": "Missing <,> at {position} in Token Stream or unexpected token: {token}",
+	"dict_end": "Missing <}}> at position {position} in Token Stream or unexpected token: {token}",
+	"list_comma": "Missing <,> at position {position} in Token Stream or unexpected token: {token}",
+	"list_end": "<]> Missing at position {position} in Token Stream or unexpected token: {token}",
+	"pair_colon": "<:> missing at {position} in Token Stream or unexpected token: {token}",
+	"value": "Unexpected Token at position {position}: {token}. Datatype should start with opening brackets or should be a terminal",
+	"unexpected": "Unexpected Token at {position}: {token}",
+	"true": "Expected <true>, got: {token}",
+	"false": "Expected <false>, got: {token}",
+	"null": "Expected <null>, got: {token}",
+}
+
+# Semantic error types (the code) and their descriptions
+SEMANTIC_MESSAGES = {
+	1: "Invalid Decimal Numbers",
+	2: "Empty Key",
+	3: "Invalid Numbers",
+	4: "Reserved Words as Dictionary Key",
+	6: "Inconsistent Types for List Elements",
+	7: "Reserved Words as Strings",
+}
+
+
+# One recorded error
+class Diagnostic:
+	__slots__ = ("source", "code", "level", "position", "kind", "token", "detail")
+
+	def __init__(self, source, code, level=None, position=None, kind=None, token=None, detail=None):
+		self.source = source
+		# Error type: lexer/parser letter code or semantic type number
+		self.code = code
+		# A, B or C for semantic errors
+		self.level = level
+		# Character position for lexer errors, position in the token stream otherwise
+		self.position = position
+		# TokenType of the token involved
+		self.kind = kind
+		self.token = token
+		# Offending character for lexer errors, message key for parser errors, expected type for semantic type 6
+		self.detail = detail
+
+	# False for the entries that are recorded but not printed
+	def printed(self):
+		if self.source == LEXER:
+			return self.code in LEXER_MESSAGES
+		if self.source == PARSER:
+			return self.code in PARSER_CONTEXTS
+		return True
+
+	# Text of the message, None for entries that are not printed
+	def format(self):
+		if not self.printed():
+			return None
+		if self.source == LEXER:
+			return LEXER_MESSAGES[self.code].format(position=self.position, character=self.detail)
+		if self.source == PARSER:
+			message = PARSER_MESSAGES[self.detail].format(position=self.position, token=self.token)
+			return f"Error trying to parse {self.token} {PARSER_CONTEXTS[self.code]}: {message}"
+		expected = f" (Expected Type: {self.detail})" if self.detail is not None else ""
+		return f"Level {self.level} Semantic Error: Type {self.code} at {self.token}{expected}: {SEMANTIC_MESSAGES[self.code]}"
+
+	def __repr__(self):
+		return f"Diagnostic({self.source}, {self.code!r}, level={self.level}, position={self.position}, kind={self.kind})"
+
+
+class Diagnostics:
+	# error_file receives the semantic errors, quiet turns off the console output,
+	# max_errors stops recording after that many printed entries (None for no limit)
+	def __init__(self, error_file=None, quiet=False, max_errors=None, buffer_size=BUFFER_SIZE):
+		self.error_file = error_file
+		self.quiet = quiet
+		self.max_errors = max_errors
+		self.buffer_size = buffer_size
+		self.entries = []
+		# Index of the first entry that has not been written out yet
+		self.emitted = 0
+		# Recorded entries that are printed, and printed entries not recorded because of max_errors
+		self.printed = 0
+		self.dropped = 0
+
+	def add(self, entry):
+		if self.max_errors is not None and self.printed >= self.max_errors:
+			if entry.printed():
+				self.dropped += 1
+			return
+		if entry.printed():
+			self.printed += 1
+		self.entries.append(entry)
+		if len(self.entries) - self.emitted >= self.buffer_size:
+			self.flush()
+
+	def lexer_error(self, code, position, character):
+		self.add(Diagnostic(LEXER, code, None, position, LEXER_KINDS.get(code), None, character))
+
+	# message is a key of PARSER_MESSAGES
+	def parser_error(self, code, message, position, token):
+		self.add(Diagnostic(PARSER, code, None, position, token.type if token is not None else None, token, message))
+
+	def semantic_error(self, level, code, position, token, expected=None):
+		self.add(Diagnostic(SEMANTIC, code, level, position, getattr(token, "type", None), token, expected))
+
+	# Number of recorded entries, optionally only those from one source or of one level
+	def count(self, source=None, level=None):
+		return sum(1 for entry in self.entries
+			if (source is None or entry.source == source) and (level is None or entry.level == level))
+
+	# Console text of the given entries (all recorded entries by default), same as the messages used to be printed
+	def text(self, entries=None):
+		lines = []
+		for entry in self.entries if entries is None else entries:
+			message = entry.format()
+			if message is not None:
+				lines.append(message + "\n")
+		return "".join(lines)
+
+	# Error file text of the given entries (all recorded entries by default)
+	def error_text(self, entries=None):
+		return self.text(entry for entry in (self.entries if entries is None else entries) if entry.source == SEMANTIC)
+
+	# Write out the pending entries, one write for the console and one for the error file
+	def flush(self):
+		pending = self.entries[self.emitted:]
+		self.emitted = len(self.entries)
+		if not pending:
+			return
+		if not self.quiet:
+			sys.stdout.write(self.text(pending))
+		if self.error_file is not None:
+			self.error_file.write(self.error_text(pending))
+
+	# Flush, report the entries dropped because of max_errors and close the error file
+	def close(self):
+		self.flush()
+		if self.dropped and not self.quiet:
+			print(f"{self.dropped} more errors not shown (limit of {self.max_errors} reached)")
+			self.quiet = True
+		if self.error_file is not None:
+			self.error_file.close()
+			self.error_file = None
@@ -0,0 +1,74 @@
+# Streams of many top-level values: concatenated or newline delimited documents (one JSON value per line).
+# for index, root, diagnostics in parse_text_documents(text):   # or parse_file_documents(file_name)
+#     ...
+# The input is lexed once and one Parser goes on from one document to the next, every document is yielded as soon
+# as it is complete, with its own Diagnostics. Error positions count from the start of the document: tokens for
+# parser and semantic errors, characters for lexer errors (from its first token, or the start of the input for
+# the first document). Lexer errors after the last token of a document belong to that document.
+# Only the document that is being parsed is kept, memory depends on the largest document and not on the stream.
+# With handler=EventHandler() the documents are parsed into events (see events.py), the handler is yielded in place
+# of the AST once all events of the document were sent.
+import mmap
+
+from diagnostics import Diagnostics, LEXER
+from events import EventParser
+from parser import Parser
+from scanner import CHUNK_SIZE, make_lexer, stream_lexer
+from tokens import TokenType, token_length
+
+# Tokens a document can start with, other tokens between documents are reported and skipped
+VALUE_STARTS = (TokenType.LBRACE, TokenType.LBRACKET, TokenType.STRING, TokenType.NUMBER, TokenType.TRUE, TokenType.FALSE, TokenType.NULL)
+
+
+# Parse every top-level value the lexer gives, yields (document index, AST or handler, Diagnostics).
+# compact and max_depth are those of Parser, max_errors limits the errors recorded per document.
+# Tokens that can not start a value are skipped with a parser error in the next document, if only such tokens are
+# left at the end a last document is yielded with None as its AST.
+def parse_documents(lexer, compact=False, max_depth=None, max_errors=None, handler=None):
+	diagnostics = Diagnostics(quiet=True, max_errors=max_errors)
+	lexer.diagnostics = diagnostics
+	tokens = lexer.iter_tokens()
+	if handler is not None:
+		theParser = EventParser(handler, "", tokens, max_depth, diagnostics)
+	else:
+		theParser = Parser("", tokens, compact, max_depth, diagnostics)
+	theParser.get_next_token()
+	document = 0
+	start = 0
+	while not theParser.at_end:
+		theParser.index = 1
+		while not theParser.at_end and theParser.current_token.type not in VALUE_STARTS:
+			diagnostics.parser_error("V", "value", theParser.index, theParser.current_token)
+			theParser.get_next_token()
+		root = None
+		if not theParser.at_end:
+			root = theParser.value()
+		for entry in diagnostics.entries:
+			if entry.source == LEXER:
+				entry.position -= start
+		yield document, (handler if handler is not None else root), diagnostics
+		document += 1
+		# The next document starts at the token the parser is looking at
+		start = lexer.position - token_length(theParser.current_token)
+		diagnostics = Diagnostics(quiet=True, max_errors=max_errors)
+		lexer.diagnostics = diagnostics
+		theParser.diagnostics = diagnostics
+
+
+# Documents of input text (see make_lexer for fast, indexed and symbols)
+def parse_text_documents(input_text, fast=False, compact=False, max_depth=None, max_errors=None, handler=None, indexed=False, symbols=None):
+	return parse_documents(make_lexer(input_text, fast, None, indexed, symbols), compact, max_depth, max_errors, handler)
+
+
+# Documents of a file, read in chunks like parser.parse_file
+def parse_file_documents(file_name, chunk_size=CHUNK_SIZE, use_mmap=False, fast=False, compact=False, max_depth=None, max_errors=None, handler=None, indexed=False, symbols=None):
+	if use_mmap:
+		with open(file_name, "rb") as file:
+			# mmap can not map empty files
+			if file.seek(0, 2) == 0:
+				return
+			with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+				yield from parse_documents(stream_lexer(mapped, chunk_size, fast, None, indexed, symbols), compact, max_depth, max_errors, handler)
+	else:
+		with open(file_name, "r") as file:
+			yield from parse_documents(stream_lexer(file, chunk_size, fast, None, indexed, symbols), compact, max_depth, max_errors, handler)
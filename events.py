@@ -0,0 +1,134 @@
+# Event driven (SAX style) parsing: the document is reported to a handler as a sequence of events instead of
+# being built into an AST.
+# class Printer(EventHandler):
+#     def scalar(self, kind, value):
+#         print(node_label(kind, value))
+# parse_text_events(text, Printer())     # or parse_file_events(file_name, handler), parse_events(tokens, handler)
+# EventParser runs the grammar methods and semantic checks of the Parser unchanged, so the errors are the same as for
+# parse_text/parse_file. Its nodes only keep their last child and no punctuation, so the memory used while parsing
+# only depends on how deeply the document is nested (plus the recorded errors, see Diagnostics max_errors).
+from diagnostics import Diagnostics
+from parser import Parser, KIND_VALUE
+from scanner import CHUNK_SIZE, make_lexer, tokenize_file
+
+
+# Receives the events, every method does nothing by default
+class EventHandler:
+	def start_dict(self):
+		pass
+
+	def end_dict(self):
+		pass
+
+	# Key of the next pair of a dict, its value follows
+	def key(self, value):
+		pass
+
+	def start_list(self):
+		pass
+
+	def end_list(self):
+		pass
+
+	# A value that is not a dict or list. kind is a KIND_* node kind (KIND_INVALID_* after parser errors),
+	# value the token value (None for true, false and null)
+	def scalar(self, kind, value):
+		pass
+
+
+# Stand-in for the AST nodes, only the last child is kept
+class EventNode:
+	__slots__ = ("kind", "value", "child")
+
+	def __init__(self, kind, value=None):
+		self.kind = kind
+		self.value = value
+		self.child = None
+
+	def add_child(self, child):
+		self.child = child
+
+
+class EventParser(Parser):
+	# handler is an EventHandler, the other arguments are those of Parser
+	def __init__(self, handler, file_name="", tokens=None, max_depth=None, diagnostics=None):
+		Parser.__init__(self, file_name, tokens, False, max_depth, diagnostics)
+		self.handler = handler
+
+	def make_node(self, kind, value=None):
+		return EventNode(kind, value)
+
+	def add_punctuation(self, node, label):
+		pass
+
+	def value_start(self):
+		node = Parser.value_start(self)
+		# A value without a child is missing (parser error or end of the tokens), there is no event for it
+		if node.kind == KIND_VALUE and node.child is not None:
+			self.handler.scalar(node.child.kind, node.child.value)
+		return node
+
+	def dict_start(self):
+		node = Parser.dict_start(self)
+		self.handler.start_dict()
+		return node
+
+	def dict_item(self, node, pair, first):
+		more = Parser.dict_item(self, node, pair, first)
+		if not more:
+			self.handler.end_dict()
+		return more
+
+	def list_start(self):
+		node = Parser.list_start(self)
+		self.handler.start_list()
+		return node
+
+	def list_item(self, node, value, first):
+		more = Parser.list_item(self, node, value, first)
+		if not more:
+			self.handler.end_list()
+		return more
+
+	def pair_start(self):
+		node = Parser.pair_start(self)
+		self.handler.key(node.child.value)
+		return node
+
+	def element_node(self, value):
+		if value.kind != KIND_VALUE:
+			return value
+		return value.child
+
+
+# Parse tokens (any iterable of Token) into events for handler, returns the handler.
+# file_name only names the error file, errors are recorded in diagnostics (a new one is used and closed if none is given).
+def parse_events(tokens, handler, file_name="", max_depth=None, diagnostics=None):
+	theParser = EventParser(handler, file_name, tokens, max_depth, diagnostics)
+	try:
+		theParser.parse()
+	finally:
+		if diagnostics is None:
+			theParser.diagnostics.close()
+	return handler
+
+
+# Scan and parse input text into events, see parser.parse_text
+def parse_text_events(input_text, handler, file_name="", fast=False, max_depth=None, diagnostics=None, indexed=False, symbols=None):
+	shared = diagnostics if diagnostics is not None else Diagnostics()
+	try:
+		return parse_events(make_lexer(input_text, fast, shared, indexed, symbols).iter_tokens(), handler, file_name, max_depth, shared)
+	finally:
+		if diagnostics is None:
+			shared.close()
+
+
+# Scan and parse a file into events, reading it in chunks, see parser.parse_file
+def parse_file_events(file_name, handler, chunk_size=CHUNK_SIZE, use_mmap=False, fast=False, max_depth=None, diagnostics=None, indexed=False, symbols=None):
+	shared = diagnostics if diagnostics is not None else Diagnostics()
+	try:
+		tokens = tokenize_file(file_name, chunk_size, use_mmap, fast, shared, indexed=indexed, symbols=symbols)
+		return parse_events(tokens, handler, file_name, max_depth, shared)
+	finally:
+		if diagnostics is None:
+			shared.close()
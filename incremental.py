@@ -0,0 +1,493 @@
+# Incremental re-lexing and re-parsing for editors.
+# doc = IncrementalDocument(text)
+# doc.edit(offset, deleted, inserted)    # replace text[offset:offset + deleted] with inserted
+# After every edit doc.tokens, doc.root, doc.lexer_errors and doc.errors are the same as scanning and parsing the new
+# text from scratch, but only the tokens around the edit are lexed again, and only the items between the commas around
+# the changed tokens in the innermost dict or list are parsed (and semantically checked) again and put into its node in
+# place of the old ones. The other items and subtrees are kept as they are.
+# Token positions of the structure are relative: where the items of a dict or list end is counted from its opening
+# bracket, and where a dict or list starts from the comma before its item. An edit only moves the item ends of the
+# containers around it. Those and the character positions of the tokens after the edit are kept in blocks that are
+# moved as a whole, so an edit does not cost a step for every later token.
+import bisect
+
+from diagnostics import Diagnostics, SEMANTIC
+from parser import Parser, KIND_DICT
+from scanner import FastDFA
+from tokens import TokenType, token_length
+
+# Tokens that go on with the next character if it is a digit or a letter
+GROWING_TOKENS = (TokenType.NUMBER, TokenType.TRUE, TokenType.FALSE, TokenType.NULL)
+# Positions per block of Positions
+POSITION_BLOCK = 512
+
+
+def same_token(a, b):
+	return a.type == b.type and a.value == b.value
+
+
+# Sorted positions in blocks, with an amount still to be added to all positions of a block. An edit changes the
+# positions of the blocks it is in and the amounts of the blocks after them, not every later position.
+class Positions:
+	__slots__ = ("blocks", "adds", "firsts", "size")
+
+	def __init__(self, values=()):
+		values = list(values)
+		self.blocks = [values[i:i + POSITION_BLOCK] for i in range(0, len(values), POSITION_BLOCK)]
+		self.adds = [0] * len(self.blocks)
+		# Index of the first position of every block
+		self.firsts = list(range(0, len(values), POSITION_BLOCK))
+		self.size = len(values)
+
+	def __len__(self):
+		return self.size
+
+	def __getitem__(self, k):
+		if k < 0 or k >= self.size:
+			raise IndexError(k)
+		b = bisect.bisect_right(self.firsts, k) - 1
+		return self.blocks[b][k - self.firsts[b]] + self.adds[b]
+
+	def append(self, value):
+		if not self.blocks or len(self.blocks[-1]) >= POSITION_BLOCK:
+			self.blocks.append([])
+			self.adds.append(0)
+			self.firsts.append(self.size)
+		self.blocks[-1].append(value - self.adds[-1])
+		self.size += 1
+
+	# Index of the first position at or after value, the length if there is none
+	def first_at(self, value):
+		blocks = self.blocks
+		adds = self.adds
+		# Blocks before low start before value
+		low = 0
+		high = len(blocks)
+		while low < high:
+			middle = (low + high) // 2
+			if blocks[middle][0] + adds[middle] < value:
+				low = middle + 1
+			else:
+				high = middle
+		if low == 0:
+			return 0
+		return self.firsts[low - 1] + bisect.bisect_left(blocks[low - 1], value - adds[low - 1])
+
+	# Replace the positions k0 to k1 with new_values, the positions after them move by shift
+	def replace(self, k0, k1, new_values, shift):
+		blocks = self.blocks
+		adds = self.adds
+		firsts = self.firsts
+		# Blocks b0 to b1 hold the positions k0 to k1 and are put together again
+		b0 = max(bisect.bisect_right(firsts, k0) - 1, 0)
+		b1 = max(bisect.bisect_right(firsts, k1), b0 + 1)
+		base = firsts[b0] if blocks else 0
+		merged = []
+		for block, add in zip(blocks[b0:b1], adds[b0:b1]):
+			merged.extend([value + add for value in block])
+		merged = merged[:k0 - base] + list(new_values) + [value + shift for value in merged[k1 - base:]]
+		# A small block takes in the next one, so that the blocks do not get ever smaller
+		if len(merged) < POSITION_BLOCK // 2 and b1 < len(blocks):
+			merged.extend([value + adds[b1] + shift for value in blocks[b1]])
+			b1 += 1
+		pieces = [merged[i:i + POSITION_BLOCK] for i in range(0, len(merged), POSITION_BLOCK)]
+		blocks[b0:b1] = pieces
+		adds[b0:b1] = [0] * len(pieces)
+		if shift:
+			for b in range(b0 + len(pieces), len(adds)):
+				adds[b] += shift
+		del firsts[b0:]
+		index = base
+		for block in blocks[b0:]:
+			firsts.append(index)
+			index += len(block)
+		self.size = index
+
+
+# Tokens of a dict or list in the AST and of its items
+class Span:
+	__slots__ = ("node", "offset", "ends", "kids", "close", "closed", "mismatch")
+
+	def __init__(self, node, offset):
+		self.node = node
+		# Index of the opening token counted from the comma (or opening bracket) before the item the dict or list is the
+		# value of, counted from the first token for the root
+		self.offset = offset
+		# For every item the index of the comma or closing bracket after it counted from the opening token, and the
+		# Span of its value if that is a dict or list
+		self.ends = Positions()
+		self.kids = []
+		# Index of the last token counted from the opening token, closed is True if the container ended by reading its
+		# own closing bracket (and not because of an error)
+		self.close = None
+		self.closed = False
+		# Item the list type check (semantic Type 6) reported, None if there is none
+		self.mismatch = None
+
+
+# Parser that records the Span of every dict and list
+class SpanParser(Parser):
+	# The first token is index + 1 in the token stream
+	def __init__(self, tokens, compact=False, index=0):
+		Parser.__init__(self, "", tokens, compact, None, Diagnostics(quiet=True))
+		self.index = index
+		# Span of the root, if the tokens start with a dict or list
+		self.root_span = None
+		# Spans of the open dicts and lists, the index of their opening token, of the token before their current item
+		# and the Span of the value of that item
+		self.open_spans = []
+		self.opens = []
+		self.item_starts = []
+		self.item_kids = []
+
+	# Go on with the items of span, whose opening token is open_index, after the token start
+	def open_span(self, span, open_index, start):
+		self.open_spans.append(span)
+		self.opens.append(open_index)
+		self.item_starts.append(start)
+		self.item_kids.append(None)
+
+	def dict_start(self):
+		return self.container_start(Parser.dict_start)
+
+	def list_start(self):
+		return self.container_start(Parser.list_start)
+
+	def dict_item(self, node, pair, first):
+		return self.container_item(Parser.dict_item, TokenType.RBRACE, node, pair, first)
+
+	def list_item(self, node, value, first):
+		return self.container_item(Parser.list_item, TokenType.RBRACKET, node, value, first)
+
+	def container_start(self, start):
+		open_index = self.index - 1
+		node = start(self)
+		if self.open_spans:
+			span = Span(node, open_index - self.item_starts[-1])
+			self.item_kids[-1] = span
+		else:
+			span = Span(node, open_index)
+			self.root_span = span
+		self.open_span(span, open_index, open_index)
+		return node
+
+	def container_item(self, item, closing, node, child, first):
+		current = self.index - 1
+		token = self.current_token
+		at_end = self.at_end
+		more = item(self, node, child, first)
+		span = self.open_spans[-1]
+		open_index = self.opens[-1]
+		span.ends.append(current - open_index)
+		span.kids.append(self.item_kids[-1])
+		self.item_kids[-1] = None
+		self.item_starts[-1] = current
+		if not more:
+			span.closed = token.type == closing and not at_end
+			span.close = current - open_index if span.closed else current - 1 - open_index
+			self.open_spans.pop()
+			self.opens.pop()
+			self.item_starts.pop()
+			self.item_kids.pop()
+		return more
+
+	def checkConsistentType(self, value):
+		consistent = Parser.checkConsistentType(self, value)
+		if not consistent:
+			span = self.open_spans[-1]
+			span.mismatch = len(span.ends)
+		return consistent
+
+
+# Item k of a dict or list node, the nodes that are not compact have punctuation children between the items
+def item_node(node, k, compact):
+	return node.children[k] if compact else node.children[2 * k + 1]
+
+
+# Index of the first entry at or after position, entries are in the order of their positions
+def first_entry_at(entries, position):
+	low = 0
+	high = len(entries)
+	while low < high:
+		middle = (low + high) // 2
+		if entries[middle].position < position:
+			low = middle + 1
+		else:
+			high = middle
+	return low
+
+
+class IncrementalDocument:
+	def __init__(self, text, compact=False):
+		self.text = text
+		self.compact = compact
+		lexer = FastDFA(text, diagnostics=Diagnostics(quiet=True))
+		self.tokens = []
+		starts = []
+		for token in lexer.iter_tokens():
+			self.tokens.append(token)
+			starts.append(lexer.position - token_length(token))
+		# Position in the text of the first character of every token
+		self.starts = Positions(starts)
+		# Lexer errors (positions in the text) and parser and semantic errors (positions in the token stream)
+		self.lexer_errors = lexer.diagnostics.entries
+		# Tokens lexed and parsed by the last edit
+		self.relexed = len(self.tokens)
+		self.reparsed = 0
+		self.parse_all()
+
+	# Parse all tokens. If the parser stops with an exception root is None and failure has the message.
+	def parse_all(self):
+		theParser = SpanParser(self.tokens, self.compact)
+		self.reparsed = len(self.tokens)
+		try:
+			self.root = theParser.parse()
+			self.failure = None
+		except Exception as exception:
+			self.root = None
+			self.failure = str(exception)
+		# Span of the root if it is a dict or list
+		self.root_span = theParser.root_span if self.failure is None else None
+		self.errors = theParser.diagnostics.entries
+		return self.root
+
+	# Diagnostics with all errors, the lexer errors first
+	def diagnostics(self):
+		diagnostics = Diagnostics(quiet=True)
+		for entry in self.lexer_errors + self.errors:
+			diagnostics.add(entry)
+		return diagnostics
+
+	# Replace text[offset:offset + deleted] with inserted. Returns the dict or list whose items were parsed again
+	# (the root if everything was parsed again), None if nothing had to be parsed again.
+	def edit(self, offset, deleted, inserted):
+		text = self.text[:offset] + inserted + self.text[offset + deleted:]
+		delta = len(inserted) - deleted
+		# First character after the edit in the new text
+		edit_end = offset + len(inserted)
+		tokens = self.tokens
+		starts = self.starts
+
+		# First token that can change is the first one that reaches into the edit, or ends right before it and could
+		# grow into it (numbers and words), lexing starts again at the end of the token before it
+		i0 = starts.first_at(offset)
+		if i0 > 0:
+			end = starts[i0 - 1] + token_length(tokens[i0 - 1])
+			if end > offset or (end == offset and tokens[i0 - 1].type in GROWING_TOKENS):
+				i0 -= 1
+		restart = starts[i0 - 1] + token_length(tokens[i0 - 1]) if i0 > 0 else 0
+
+		# Lex until a token starts after the edit where an old token with the same value started,
+		# from there on the lexer would give the old tokens again
+		lexer = FastDFA(text, diagnostics=Diagnostics(quiet=True))
+		lexer.move(restart)
+		new_tokens = []
+		new_starts = []
+		i1 = len(tokens)
+		while True:
+			token = lexer.get_next_token()
+			if not token:
+				continue
+			if token.type == TokenType.EOF:
+				break
+			start = lexer.position - token_length(token)
+			if start >= edit_end:
+				k = starts.first_at(start - delta)
+				if k < len(tokens) and starts[k] == start - delta and same_token(tokens[k], token):
+					i1 = k
+					break
+			new_tokens.append(token)
+			new_starts.append(start)
+		self.relexed = len(new_tokens)
+
+		# Lexer errors between restart and the first reused token are replaced by the new ones
+		lexer_errors = self.lexer_errors
+		later = first_entry_at(lexer_errors, starts[i1]) if i1 < len(tokens) else len(lexer_errors)
+		after = lexer_errors[later:]
+		for entry in after:
+			entry.position += delta
+		self.lexer_errors = lexer_errors[:first_entry_at(lexer_errors, restart)] + lexer.diagnostics.entries + after
+
+		unchanged = len(new_tokens) == i1 - i0 and all(same_token(a, b) for a, b in zip(new_tokens, tokens[i0:i1]))
+		tokens[i0:i1] = new_tokens
+		starts.replace(i0, i1, new_starts, delta)
+		self.text = text
+		if unchanged:
+			# Only whitespace or the spelling of the same tokens changed
+			self.reparsed = 0
+			return None
+		return self.reparse(i0, i1, len(new_tokens) - (i1 - i0))
+
+	# Parse again after the old tokens i0 to i1 were replaced, changing the number of tokens by shift.
+	# The items of the innermost dict or list around the changed tokens are parsed on their own; if they do not end at
+	# the comma or bracket they ended at before, the item of the enclosing container is tried, and in the end the whole
+	# document.
+	def reparse(self, i0, i1, shift):
+		span = self.root_span
+		if span is not None:
+			# The tokens after the token the top-level value ended at are only read, nothing depends on them unless
+			# the parser ran out of tokens there
+			end = span.offset + span.ends[len(span.ends) - 1]
+			if i0 > end and (span.closed or end + 1 < len(self.tokens) - shift):
+				self.reparsed = 0
+				return None
+		path = self.containers_around(i0, i1)
+		for level in range(len(path) - 1, -1, -1):
+			if self.reparse_items(path, level, shift):
+				return path[level][0].node
+		return self.parse_all()
+
+	# The dicts and lists around the old tokens i0 to i1 from the root down, as (span, index of the opening token,
+	# first item, last item) of the items the tokens are in. Every container is the value of the one item of the
+	# container before it.
+	def containers_around(self, i0, i1):
+		path = []
+		span = self.root_span
+		open_index = span.offset if span is not None else 0
+		while span is not None and open_index < i0 and i1 <= open_index + span.close:
+			first = span.ends.first_at(i0 - open_index)
+			last = span.ends.first_at(i1 - open_index)
+			path.append((span, open_index, first, last))
+			if first != last:
+				break
+			start = open_index + (span.ends[first - 1] if first > 0 else 0)
+			span = span.kids[first]
+			if span is not None:
+				open_index = start + span.offset
+		return path
+
+	# Parse the items of the container at path[level] again and put them in place of the old ones. Returns False if
+	# the new items do not end at the comma or bracket the old ones ended at, nothing is changed then.
+	def reparse_items(self, path, level, shift):
+		span, open_index, first, last = path[level]
+		if last == len(span.ends) - 1 and not span.closed:
+			return False
+		# Comma or bracket before the items, and the one after them in the new tokens
+		start = open_index + (span.ends[first - 1] if first > 0 else 0)
+		end = open_index + span.ends[last] + shift
+		if level > 0:
+			# At the end of the tokens the item of the container around can end at the same bracket
+			parent, parent_open, k, _ = path[level - 1]
+			if parent_open + parent.ends[k] == end - shift:
+				return False
+		is_dict = span.node.kind == KIND_DICT
+		theParser = SpanParser(self.tokens[start + 1:end + 1], self.compact, start + 1)
+		items = Span(theParser.make_node(span.node.kind), span.offset)
+		theParser.open_span(items, open_index, start)
+		if is_dict:
+			closing = TokenType.RBRACE
+			item = Parser.dict_item
+		else:
+			closing = TokenType.RBRACKET
+			item = Parser.list_item
+			# The list type check goes on from where it was before the items, and has to be where it was after them
+			theParser.list_types.append(self.list_state(span, first))
+			state = self.list_state(span, last + 1)
+		try:
+			theParser.get_next_token()
+			while True:
+				if is_dict:
+					node = theParser.pair_start()
+					node.add_child(theParser.value())
+				else:
+					node = theParser.value()
+				current = theParser.index - 1
+				if theParser.at_end:
+					return False
+				more = theParser.container_item(item, closing, items.node, node, first == 0 and not items.kids)
+				if current == end:
+					break
+				if not more:
+					return False
+		except Exception:
+			return False
+		# Items after the new ones whose list type check changes, checked before anything is changed
+		if not is_dict:
+			later = span.mismatch if span.mismatch is not None and span.mismatch > last else None
+			changed = more and theParser.list_types[-1] != state
+			found = None
+			if changed:
+				found = self.check_list_after(span, open_index, last + 1, theParser.list_types[-1])
+				for k in (later, found[0] if found else None):
+					if k is not None and not self.plain_separator(open_index + span.ends[k] + shift):
+						return False
+		self.reparsed = end - start
+
+		# Errors: those of the old items are replaced, the later ones are found at tokens that moved by shift.
+		# Positions are those of the token the error was found at, counting from 1.
+		errors = self.errors
+		if not is_dict and changed:
+			if later is not None:
+				position = open_index + span.ends[later] + 1
+				for i in range(first_entry_at(errors, position), len(errors)):
+					if errors[i].source == SEMANTIC and errors[i].code == 6:
+						del errors[i]
+						break
+			if found:
+				errors.insert(first_entry_at(errors, found[1].position + 1), found[1])
+		e0 = first_entry_at(errors, start + 2)
+		e1 = first_entry_at(errors, end - shift + 2)
+		for entry in errors[e1:]:
+			entry.position += shift
+		errors[e0:e1] = theParser.diagnostics.entries
+
+		children = span.node.children
+		if self.compact:
+			children[first:last + 1] = items.node.children
+		else:
+			children[2 * first + 1:2 * last + 3] = items.node.children
+		if is_dict:
+			# The pairs of the key index may have been replaced
+			span.node.key_index = None
+
+		# The ends of the new items replace the old ones, the later ends and those of the containers around move
+		moved = len(items.kids) - (last + 1 - first)
+		span.ends.replace(first, last + 1, list(items.ends), shift)
+		span.kids[first:last + 1] = items.kids
+		span.close += shift
+		for parent, _, k, _ in path[:level]:
+			parent.ends.replace(k, k, [], shift)
+			parent.close += shift
+
+		if not is_dict:
+			if items.mismatch is not None:
+				span.mismatch = first + items.mismatch
+			elif span.mismatch is not None and span.mismatch < first:
+				pass
+			elif changed:
+				span.mismatch = found[0] + moved if found else None
+			else:
+				span.mismatch = later + moved if later is not None else None
+		return True
+
+	# State of the list type check (see Parser.checkConsistentType) before item k of a list
+	def list_state(self, span, k):
+		if span.mismatch is not None and span.mismatch < k:
+			return False
+		# The type of the first element that is not missing, the items before k all have it
+		checker = Parser(tokens=(), compact=self.compact, diagnostics=Diagnostics(quiet=True))
+		checker.list_types.append(None)
+		for i in range(k):
+			if checker.list_types[-1] is not None:
+				break
+			checker.checkConsistentType(item_node(span.node, i, self.compact))
+		return checker.list_types[-1]
+
+	# Run the list type check for the items of a list from k on, starting from state. Returns the first item it
+	# reports and the error, None if there is none.
+	def check_list_after(self, span, open_index, k, state):
+		checker = Parser(tokens=(), compact=self.compact, diagnostics=Diagnostics(quiet=True))
+		checker.list_types.append(state)
+		for i in range(k, len(span.ends)):
+			if checker.list_types[-1] is False:
+				break
+			checker.index = open_index + span.ends[i] + 1
+			if not checker.checkConsistentType(item_node(span.node, i, self.compact)):
+				return i, checker.diagnostics.entries[0]
+		return None
+
+	# The token after a list item is a comma or a closing bracket that is not the last token, the list type check of
+	# the item is then the last error reported at it
+	def plain_separator(self, index):
+		token_type = self.tokens[index].type
+		return token_type == TokenType.COMMA or (token_type == TokenType.RBRACKET and index < len(self.tokens) - 1)
@@ -0,0 +1,272 @@
+# Lazy documents: parse only the parts of a document that are used.
+# doc = lazy_text(text)                  # or lazy_file(file_name), or LazyDocument(text)
+# node = doc["a"][3]                     # LazyNode, nothing is parsed yet
+# tree = node.parse()                    # AST of that subtree (Node or CompactNode), semantically checked
+# The document keeps the input text and lexes nothing up front. Going down a path lexes only the tokens of the
+# containers on the path (keys, colons, commas and the first token of every item) and skips the items off the path
+# in the raw text, by matching brackets outside strings like parallel.split_chunks does, without lexing them. Where
+# every skipped dict and list ends is remembered. parse() lexes and parses the text of that subtree alone.
+# Lexer, parser and semantic errors of a subtree are reported when it is parsed, at the same positions as in a full
+# parse (the tokens before the subtree are only counted if one of its parser or semantic errors needs them).
+# Paths can only be followed through well formed dicts and lists, parse() works on any subtree.
+import re
+from bisect import bisect_right
+
+from diagnostics import Diagnostics, LEXER
+from parser import Parser, KIND_DICT, KIND_LIST, KIND_STRING, KIND_NUMBER, KIND_TRUE, KIND_FALSE, KIND_NULL, KIND_VALUE
+from scanner import FastDFA
+from tokens import TokenType
+
+# Node kind of the first token of a value
+TOKEN_KINDS = {
+	TokenType.LBRACE: KIND_DICT,
+	TokenType.LBRACKET: KIND_LIST,
+	TokenType.STRING: KIND_STRING,
+	TokenType.NUMBER: KIND_NUMBER,
+	TokenType.TRUE: KIND_TRUE,
+	TokenType.FALSE: KIND_FALSE,
+	TokenType.NULL: KIND_NULL,
+}
+CLOSING = {
+	TokenType.LBRACE: TokenType.RBRACE,
+	TokenType.LBRACKET: TokenType.RBRACKET,
+}
+# Text up to the next bracket outside strings (or an unterminated string)
+NO_BRACKETS = re.compile(r'[^"\[\]{}]*(?:"[^"]*"[^"\[\]{}]*)*')
+CLOSING_CHARS = {"[": "]", "{": "}"}
+
+
+class LazyDocument:
+	# input_text is the whole document. compact builds the parsed subtrees out of CompactNodes, string values of the
+	# lexed tokens are interned in symbols (if not None). Errors of parsed subtrees are recorded in diagnostics, a new
+	# one if none is given.
+	def __init__(self, input_text, compact=False, diagnostics=None, symbols=None):
+		self.input_text = input_text
+		self.compact = compact
+		self.diagnostics = diagnostics if diagnostics is not None else Diagnostics()
+		self.symbols = symbols
+		# Lexer for the tokens on paths, its errors are reported when the subtree is parsed
+		self.lexer = FastDFA(input_text, diagnostics=Diagnostics(quiet=True), symbols=symbols)
+		# Character index of the closing bracket of every dict and list skipped or scanned so far, by the index of its
+		# opening bracket
+		self.extents = {}
+		# Number of tokens before some character indices (sorted), to number the parser errors of subtrees
+		self.count_positions = [0]
+		self.counts = [0]
+		# LazyNodes already created, by the character index they are lexed from
+		self.nodes = {}
+
+	# The value the document starts with
+	@property
+	def root(self):
+		return self.node_at(0)
+
+	def __getitem__(self, key):
+		return self.root[key]
+
+	# LazyNode of the value lexed from character index i
+	def node_at(self, i):
+		node = self.nodes.get(i)
+		if node is None:
+			node = LazyNode(self, i)
+			self.nodes[i] = node
+		return node
+
+	# Next token from character index i and the index after it, failed recognitions are dropped like iter_tokens does
+	def token_at(self, i):
+		self.lexer.move(i)
+		token = self.lexer.get_next_token()
+		while not token:
+			token = self.lexer.get_next_token()
+		return token, self.lexer.index
+
+	# Character index of the bracket closing the one at character index i, found in the raw text by jumping from bracket
+	# to bracket. Closing brackets of the wrong type are passed over.
+	def extent(self, i):
+		close = self.extents.get(i)
+		if close is not None:
+			return close
+		text = self.input_text
+		# Closing bracket expected for every container that is still open
+		expected = [CLOSING_CHARS[text[i]]]
+		j = i + 1
+		while True:
+			j = NO_BRACKETS.match(text, j).end()
+			if j >= len(text) or text[j] == '"':
+				break
+			char = text[j]
+			if char in CLOSING_CHARS:
+				expected.append(CLOSING_CHARS[char])
+			elif char == expected[-1]:
+				expected.pop()
+				if not expected:
+					self.extents[i] = j
+					return j
+			j += 1
+		raise Exception(f"Unbalanced brackets: no closing bracket for '{self.input_text[i]}' at character {i}")
+
+	# Number of tokens that end at or before character index i, lexed from the nearest counted index before it
+	def token_count(self, i):
+		k = bisect_right(self.count_positions, i) - 1
+		if self.count_positions[k] == i:
+			return self.counts[k]
+		count = self.counts[k]
+		lexer = FastDFA(self.input_text, diagnostics=Diagnostics(quiet=True))
+		lexer.move(self.count_positions[k])
+		while True:
+			token = lexer.get_next_token()
+			if lexer.index > i or (token and token.type == TokenType.EOF):
+				break
+			if token:
+				count += 1
+		self.count_positions.insert(k + 1, i)
+		self.counts.insert(k + 1, count)
+		return count
+
+	# Lex and parse the text from character index first to end with the Parser. Lexer errors have their positions in
+	# the whole text already, the positions of the other errors are moved by the number of tokens before first.
+	def parse_range(self, first, end):
+		lexer = FastDFA(self.input_text, diagnostics=Diagnostics(quiet=True), symbols=self.symbols)
+		lexer.move(first)
+		theParser = Parser(tokens=tokens_until(lexer, end), compact=self.compact, diagnostics=lexer.diagnostics)
+		tree = theParser.parse()
+		entries = lexer.diagnostics.entries
+		if any(entry.source != LEXER for entry in entries):
+			offset = self.token_count(first)
+			for entry in entries:
+				if entry.source != LEXER:
+					entry.position += offset
+		for entry in entries:
+			self.diagnostics.add(entry)
+		self.diagnostics.flush()
+		return tree
+
+
+# Tokens of the lexer up to character index end (not included), failed recognitions are dropped like iter_tokens does
+def tokens_until(lexer, end):
+	while lexer.index < end:
+		token = lexer.get_next_token()
+		if token and token.type == TokenType.EOF:
+			return
+		if token:
+			yield token
+
+
+# One value of a LazyDocument, given by its range in the text
+class LazyNode:
+	def __init__(self, document, first):
+		token, end = document.token_at(first)
+		if token.type == TokenType.EOF:
+			raise Exception(f"No value at character {first}" if first else "Empty Token Stream")
+		self.document = document
+		self.first = first
+		self.token = token
+		self.kind = TOKEN_KINDS.get(token.type, KIND_VALUE)
+		# Character index of the opening bracket of a dict or list (None for other values) and the index after the first token
+		self.open = end - 1 if token.type in CLOSING else None
+		self.after = end
+		# Items of a dict or list as (key, character index of the value) once they were looked at, the key is None in lists
+		self.items = None
+		# Parsed AST of the subtree
+		self.tree = None
+
+	def __repr__(self):
+		return f"LazyNode({self.token}, character {self.first})"
+
+	# Character index after the value, the closing bracket of a dict or list is looked for only when it is needed
+	@property
+	def end(self):
+		if self.open is None:
+			return self.after
+		return self.document.extent(self.open) + 1
+
+	# Items of the dict or list, found by lexing the tokens between them and skipping over nested containers. The closing
+	# bracket is the first one of the right type after an item.
+	def scan_items(self):
+		if self.items is not None:
+			return self.items
+		if self.kind != KIND_DICT and self.kind != KIND_LIST:
+			raise Exception(f"{self.token} at character {self.first} is not a dict or list")
+		document = self.document
+		is_dict = self.kind == KIND_DICT
+		items = []
+		closing = CLOSING[self.token.type]
+		# Character index the current token was lexed from, i is the index after it
+		start = self.open + 1
+		token, i = document.token_at(start)
+		if token.type != closing:
+			while True:
+				key = None
+				if is_dict:
+					if token.type != TokenType.STRING:
+						raise self.syntax_error(token, i)
+					key = token.value
+					token, i = document.token_at(i)
+					if token.type != TokenType.COLON:
+						raise self.syntax_error(token, i)
+					start = i
+					token, i = document.token_at(start)
+				if token.type not in TOKEN_KINDS:
+					raise self.syntax_error(token, i)
+				items.append((key, start))
+				if token.type in CLOSING:
+					i = document.extent(i - 1) + 1
+				token, i = document.token_at(i)
+				if token.type == closing:
+					break
+				if token.type != TokenType.COMMA:
+					raise self.syntax_error(token, i)
+				start = i
+				token, i = document.token_at(start)
+		document.extents[self.open] = i - 1
+		self.items = items
+		return items
+
+	def syntax_error(self, token, i):
+		return Exception(f"Unexpected Token before character {i}: {token}, "
+			f"path queries need well formed containers (parse() the container instead)")
+
+	# Value of a key in a dict (the first pair with that key) or of an index in a list
+	def __getitem__(self, key):
+		items = self.scan_items()
+		if self.kind == KIND_DICT:
+			for item_key, first in items:
+				if item_key == key:
+					return self.document.node_at(first)
+			raise KeyError(key)
+		if not isinstance(key, int):
+			raise TypeError(f"list indices must be integers, not {type(key).__name__}")
+		return self.document.node_at(items[key][1])
+
+	def get(self, key, default=None):
+		try:
+			return self[key]
+		except (KeyError, IndexError):
+			return default
+
+	# Keys of a dict in document order
+	def keys(self):
+		if self.kind != KIND_DICT:
+			raise Exception(f"{self.token} at character {self.first} is not a dict")
+		return [key for key, _ in self.scan_items()]
+
+	def __len__(self):
+		return len(self.scan_items())
+
+	# Parse and check the subtree, returns its AST
+	def parse(self):
+		if self.tree is None:
+			self.tree = self.document.parse_range(self.first, self.end)
+		return self.tree
+
+
+# Lazy document of input text (see LazyDocument for the arguments)
+def lazy_text(input_text, compact=False, diagnostics=None, symbols=None):
+	return LazyDocument(input_text, compact, diagnostics, symbols)
+
+
+# Lazy document of a file, which is read into one string
+def lazy_file(file_name, compact=False, diagnostics=None, symbols=None):
+	with open(file_name, "r") as file:
+		input_text = file.read()
+	return LazyDocument(input_text, compact, diagnostics, symbols)
@@ -0,0 +1,190 @@
+# Native Python values: the document is built straight into dict, list, str, int, float, bool and None while it is
+# parsed, without the AST and its labels.
+# data = to_python(text)        # or to_python_file(file_name), parse_native(tokens)
+# NativeParser runs the grammar methods and semantic checks of the Parser unchanged, so the errors are the same as for
+# parse_text/parse_file. Numbers are converted once when their token is read (int when they have no fraction or
+# exponent, float otherwise, the token text if Python can not read it). Duplicate keys keep the last value. Elements
+# and pairs whose value or key is missing (as in [] or [1,]) are left out.
+# With arrays="array" lists whose elements are all numbers become array.array('q') or array.array('d'), with
+# arrays="numpy" numpy arrays (array.array without numpy). Lists that do not fit (mixed types, integers over 64 bits)
+# stay lists.
+from array import array
+
+from diagnostics import Diagnostics
+from parser import Parser, KIND_VALUE, KIND_DICT, KIND_LIST, KIND_PAIR, KIND_STRING, KIND_NUMBER, KIND_TRUE, KIND_FALSE, KIND_NULL
+from scanner import CHUNK_SIZE, SymbolTable, make_lexer, tokenize_file
+from tokens import TokenType
+
+# NumPy is optional, arrays="numpy" falls back to array.array without it
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+# Numbers with at most this many (ASCII) digits always fit in 64 bits, they are converted with int() right away
+SHORT_INTEGER = 18
+# Values of the leaves without a token value
+CONSTANTS = {KIND_TRUE: True, KIND_FALSE: False, KIND_NULL: None}
+# Key of a pair that has not been read yet
+MISSING = object()
+# Native value of a value or key whose token is missing (as in [] or [1,]), the element or pair is left out
+ABSENT = object()
+# Tokens a key is read from, any other token where the key should be (a bracket, comma or colon) means it is missing
+KEY_TOKENS = (TokenType.STRING, TokenType.NUMBER, TokenType.TRUE, TokenType.FALSE, TokenType.NULL)
+
+
+# Value of a NUMBER token
+def number_value(text):
+	if len(text) <= SHORT_INTEGER and text.isascii() and text.isdigit():
+		return int(text)
+	try:
+		if "." in text or "e" in text or "E" in text:
+			return float(text)
+		return int(text)
+	except ValueError:
+		return text
+
+
+# Stand-in for the AST nodes. native is the Python value, kind and value are those of the leaf for the semantic checks.
+# A value node takes over the leaf that is added to it.
+class NativeNode:
+	__slots__ = ("kind", "value", "native")
+
+	def __init__(self, kind, value=None, native=None):
+		self.kind = kind
+		self.value = value
+		self.native = native
+
+	def add_child(self, child):
+		self.kind = child.kind
+		self.value = child.value
+		self.native = child.native
+
+
+class NativeDict(NativeNode):
+	__slots__ = ()
+
+	def add_child(self, pair):
+		if pair.value is not ABSENT and pair.native is not ABSENT:
+			self.native[pair.value] = pair.native
+
+
+class NativeList(NativeNode):
+	__slots__ = ()
+
+	def add_child(self, value):
+		if value.native is not ABSENT:
+			self.native.append(value.native)
+
+
+# value is the key once it is added, native the value
+class NativePair(NativeNode):
+	__slots__ = ()
+
+	def add_child(self, child):
+		if self.value is MISSING:
+			self.value = child.native
+		else:
+			self.native = child.native
+
+
+class NativeParser(Parser):
+	# arrays is None, "array" or "numpy" (see above), the other arguments are those of Parser
+	def __init__(self, file_name="", tokens=None, max_depth=None, diagnostics=None, arrays=None):
+		Parser.__init__(self, file_name, tokens, False, max_depth, diagnostics)
+		self.arrays = arrays
+		# Element type of the last list element checked by checkConsistentType, that of the list once it is closed
+		self.last_list_type = None
+
+	def make_node(self, kind, value=None):
+		if kind == KIND_NUMBER:
+			return NativeNode(kind, value, number_value(value))
+		if kind == KIND_STRING:
+			# Parser.string makes the key of a pair from whatever token is there
+			if self.current_token.type not in KEY_TOKENS:
+				return NativeNode(kind, value, ABSENT)
+			return NativeNode(kind, value, value)
+		if kind == KIND_VALUE:
+			# Stays ABSENT if no leaf is added
+			return NativeNode(kind, None, ABSENT)
+		if kind == KIND_DICT:
+			return NativeDict(kind, None, {})
+		if kind == KIND_LIST:
+			return NativeList(kind, None, [])
+		if kind == KIND_PAIR:
+			return NativePair(kind, MISSING)
+		# true, false, null, and the token value for invalid leaves
+		return NativeNode(kind, value, CONSTANTS.get(kind, value))
+
+	def add_punctuation(self, node, label):
+		pass
+
+	def list_item(self, node, value, first):
+		more = Parser.list_item(self, node, value, first)
+		if not more and self.arrays is not None and self.last_list_type == KIND_NUMBER:
+			node.native = number_array(node.native, self.arrays)
+		return more
+
+	def checkConsistentType(self, value):
+		consistent = Parser.checkConsistentType(self, value)
+		self.last_list_type = self.list_types[-1]
+		return consistent
+
+	# A value node has the kind of its leaf, it is still a value node if the value is missing
+	def element_node(self, value):
+		if value.kind == KIND_VALUE:
+			return None
+		return value
+
+
+# A list of numbers as an array, or the list itself if the numbers do not fit one
+def number_array(items, arrays):
+	if arrays == "numpy" and numpy is not None:
+		result = numpy.array(items)
+		return result if result.dtype.kind in "if" else items
+	try:
+		return array("q", items)
+	except OverflowError:
+		return items
+	except TypeError:
+		pass
+	try:
+		return array("d", items)
+	except TypeError:
+		# Numbers that were kept as text
+		return items
+
+
+# Parse tokens (any iterable of Token) into Python values, see parser.parse_tokens for the other arguments
+def parse_native(tokens, file_name="", max_depth=None, diagnostics=None, arrays=None):
+	theParser = NativeParser(file_name, tokens, max_depth, diagnostics, arrays)
+	try:
+		native = theParser.parse().native
+		return None if native is ABSENT else native
+	finally:
+		if diagnostics is None:
+			theParser.diagnostics.close()
+
+
+# Scan and parse input text into Python values, see parser.parse_text. The strings become keys and values of the result,
+# so they are interned (in a new SymbolTable if symbols is None) and repeated keys are one str object like with json.loads.
+def to_python(input_text, file_name="", fast=False, max_depth=None, diagnostics=None, indexed=False, symbols=None, arrays=None):
+	shared = diagnostics if diagnostics is not None else Diagnostics()
+	symbols = symbols if symbols is not None else SymbolTable()
+	try:
+		return parse_native(make_lexer(input_text, fast, shared, indexed, symbols).iter_tokens(), file_name, max_depth, shared, arrays)
+	finally:
+		if diagnostics is None:
+			shared.close()
+
+
+# Scan and parse a file into Python values, reading it in chunks, see parser.parse_file (symbols as for to_python)
+def to_python_file(file_name, chunk_size=CHUNK_SIZE, use_mmap=False, fast=False, max_depth=None, diagnostics=None, indexed=False, symbols=None, arrays=None):
+	shared = diagnostics if diagnostics is not None else Diagnostics()
+	symbols = symbols if symbols is not None else SymbolTable()
+	try:
+		tokens = tokenize_file(file_name, chunk_size, use_mmap, fast, shared, indexed=indexed, symbols=symbols)
+		return parse_native(tokens, file_name, max_depth, shared, arrays)
+	finally:
+		if diagnostics is None:
+			shared.close()
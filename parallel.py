@@ -0,0 +1,186 @@
+# Parallel parsing of one large document whose top level is a dict or list with many items.
+# root = parallel_parse_text(text, workers=4)       # or parallel_parse_file(file_name)
+# The text is split at commas of the top-level container (found by matching brackets outside strings in the raw
+# text), and the chunks are lexed, parsed and semantically checked in a process pool. Every worker parses the items
+# of its chunk like the Parser parses the items of the container and returns their ASTs, which are put together into
+# one AST. Positions of the errors are moved from the chunk to the whole document and the errors are put in the order
+# a serial parse finds them, so the AST and the errors are exactly those of parse_text.
+# If the document can not be split this way (no top-level container, an unterminated string, or an item that the
+# parser does not end at the comma after it), or a worker fails, the document is parsed serially instead.
+import gc
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from diagnostics import Diagnostics, LEXER
+from parser import Parser, KIND_DICT, KIND_LIST, parse_text, error_file_name
+from scanner import FastDFA
+from tokens import TokenType
+
+# Documents with fewer top-level items are parsed serially
+MIN_ITEMS = 1024
+# Chunks per worker, more chunks even out items of different sizes
+CHUNKS_PER_WORKER = 4
+# Strings, an unterminated string, opening and closing brackets and commas, by group number
+STRUCTURE = re.compile(r'("[^"]*")|(")|([\[{])|([\]}])|(,)')
+STRING_GROUP, QUOTE_GROUP, OPEN_GROUP, CLOSE_GROUP, COMMA_GROUP = 1, 2, 3, 4, 5
+CLOSING = {TokenType.LBRACE: TokenType.RBRACE, TokenType.LBRACKET: TokenType.RBRACKET}
+
+
+# Parse the items in a chunk of the top-level container in a worker. text runs from the first character after a
+# top-level comma (or the opening bracket) to the end of the next top-level comma, or to the end of the input for
+# the last chunk. Tokens are counted from the start of the chunk and characters from the start of text.
+# Returns the ASTs of the items, all errors of the chunk, (number of errors, index of the comma) after every item,
+# and the number of tokens read. Returns None if an item does not end at a comma (or the closing bracket).
+def parse_chunk(text, is_dict, closing, last, compact, max_depth):
+	diagnostics = Diagnostics(quiet=True)
+	theParser = Parser(tokens=FastDFA(text, diagnostics=diagnostics).iter_tokens(), compact=compact, max_depth=max_depth, diagnostics=diagnostics)
+	theParser.get_next_token()
+	nodes = []
+	marks = []
+	while not theParser.at_end:
+		# Items are parsed inside the top-level container, a pair of a dict the same way value() parses it
+		if is_dict:
+			node = theParser.pair_start()
+			node.add_child(theParser.value(1))
+		else:
+			node = theParser.value(1)
+		if theParser.at_end:
+			return None
+		nodes.append(node)
+		marks.append((len(diagnostics.entries), theParser.index))
+		type_ = theParser.current_token.type
+		if type_ == TokenType.COMMA:
+			theParser.get_next_token()
+			if theParser.at_end and not last:
+				return nodes, diagnostics.entries, marks, theParser.index
+		elif type_ == closing and last:
+			# The serial parse reads the tokens after the document as well
+			theParser.get_next_token()
+			for _ in theParser.tokenStream:
+				pass
+			return nodes, diagnostics.entries, marks, theParser.index
+		else:
+			return None
+	return None
+
+
+# Parse input_text on workers processes (the number of CPUs if None, 1 parses in this process), see parse_text for
+# the other arguments. Returns the AST.
+def parallel_parse_text(input_text, file_name="", workers=None, fast=False, compact=False, max_depth=None, diagnostics=None, indexed=False):
+	shared = diagnostics if diagnostics is not None else Diagnostics()
+	try:
+		root = parse_parallel(input_text, file_name, workers or os.cpu_count() or 1, compact, max_depth, shared)
+		if root is None:
+			root = parse_text(input_text, file_name, "", fast, compact, max_depth, shared, indexed=indexed)
+		return root
+	finally:
+		if diagnostics is None:
+			shared.close()
+
+
+# Same as parallel_parse_text for a file, errors are written to <file>_errors.txt
+def parallel_parse_file(file_name, workers=None, fast=False, compact=False, max_depth=None, diagnostics=None, indexed=False):
+	with open(file_name, "r") as file:
+		input_text = file.read()
+	return parallel_parse_text(input_text, file_name, workers, fast, compact, max_depth, diagnostics, indexed)
+
+
+# Character positions where the chunks start (the first one at start, right after the opening bracket), chunks are
+# about size characters long. Returns them with the number of top-level items, or None if the container is not
+# closed or a string is not terminated.
+def split_chunks(input_text, start, size):
+	cuts = [start]
+	target = start + size
+	depth = 1
+	commas = 0
+	for match in STRUCTURE.finditer(input_text, start):
+		group = match.lastindex
+		if group == STRING_GROUP:
+			continue
+		if group == COMMA_GROUP:
+			if depth == 1:
+				commas += 1
+				if match.start() >= target:
+					cuts.append(match.end())
+					target = match.end() + size
+		elif group == OPEN_GROUP:
+			depth += 1
+		elif group == CLOSE_GROUP:
+			depth -= 1
+			if depth == 0:
+				return cuts, commas + 1
+		else:
+			return None
+	return None
+
+
+# Returns None if the document has to be parsed serially, nothing has been added to diagnostics then
+def parse_parallel(input_text, file_name, workers, compact, max_depth, diagnostics):
+	if max_depth is not None and max_depth < 1:
+		return None
+	# The first token has to open the container, lexer errors before it come first
+	lexer = FastDFA(input_text, diagnostics=Diagnostics(quiet=True))
+	first = next(lexer.iter_tokens(), None)
+	if first is None or first.type not in CLOSING:
+		return None
+	split = split_chunks(input_text, lexer.position, max(1, len(input_text) // (workers * CHUNKS_PER_WORKER)))
+	if split is None or split[1] < MIN_ITEMS:
+		return None
+	cuts = split[0]
+	is_dict = first.type == TokenType.LBRACE
+	count = len(cuts)
+	tasks = [(input_text[cuts[k]:cuts[k + 1] if k + 1 < count else len(input_text)], is_dict, CLOSING[first.type], k + 1 == count, compact, max_depth)
+		for k in range(count)]
+
+	# The results are new trees without cycles, the garbage collector would only walk them over and over
+	collecting = gc.isenabled()
+	gc.disable()
+	try:
+		if workers == 1:
+			results = [parse_chunk(*task) for task in tasks]
+		else:
+			with ProcessPoolExecutor(workers) as executor:
+				results = list(executor.map(parse_chunk, *zip(*tasks)))
+	except Exception:
+		return None
+	finally:
+		if collecting:
+			gc.enable()
+	if any(result is None for result in results):
+		return None
+
+	# Put the items together the way the Parser does (dict_item/list_item of the top-level container)
+	builder = Parser(tokens=(), compact=compact, diagnostics=Diagnostics(quiet=True))
+	root = builder.make_node(KIND_DICT if is_dict else KIND_LIST)
+	builder.add_punctuation(root, "{" if is_dict else "[")
+	builder.list_types.append(None)
+	entries = list(lexer.diagnostics.entries)
+	# Tokens before the chunk, the opening bracket is the first one
+	offset = 1
+	for k, (nodes, chunk_entries, marks, tokens) in enumerate(results):
+		for entry in chunk_entries:
+			entry.position += cuts[k] if entry.source == LEXER else offset
+		used = 0
+		for node, (errors, comma) in zip(nodes, marks):
+			entries.extend(chunk_entries[used:errors])
+			used = errors
+			root.add_child(node)
+			if not is_dict:
+				builder.index = offset + comma
+				if not builder.checkConsistentType(node):
+					entries.extend(builder.diagnostics.entries)
+			builder.add_punctuation(root, ",")
+		entries.extend(chunk_entries[used:])
+		offset += tokens
+	if not compact:
+		# The last item is followed by the closing bracket instead of a comma
+		root.children.pop()
+	builder.add_punctuation(root, "}" if is_dict else "]")
+
+	if file_name and diagnostics.error_file is None:
+		diagnostics.error_file = open(error_file_name(file_name), "w")
+	for entry in entries:
+		diagnostics.add(entry)
+	diagnostics.flush()
+	return root
@@ -1,144 +1,215 @@
-# Since I implemented using Tokens and scanner first and then converted to reading a file,
-# I found it easier to just put the token class in the Parser which was earlier in the scanner.
-# This still works by reading tokens from a file, format for which is given in README.
-
-class TokenType:
-	SEMICOLON = 'SEMICOLON'  # ';'
-	LBRACE = 'LBRACE'  # '{'
-	RBRACE = 'RBRACE'  # '}'
-	LBRACKET = 'LBRACKET'  # '['
-	RBRACKET = 'RBRACKET'  # ']'
-	NULL = 'NULL'  # 'null'
-	FALSE = 'FALSE'  # 'false'
-	TRUE = 'TRUE'  # 'true'
-	COMMA = 'COMMA'  # ','
-	COLON = 'COLON'  # ':'
-	STRING = 'STRING'  # Tree leaves or node names
-	NUMBER = 'NUMBER'  # Edge lengths or numeric values
-	EOF = 'EOF'  # End of input
-
-
-class Token:
-	def __init__(self, type_, value=None):
-		self.type = type_
-		self.value = value
-	
-	def __repr__(self):
-		if self.type == TokenType.STRING:
-			return f"<STR, {self.value}>"
-		elif self.type == TokenType.NUMBER:
-			return f"<NUM, {self.value}>"
-		elif self.type == TokenType.LBRACE:
-			return "<{>"
-		elif self.type == TokenType.RBRACE:
-			return "<}>"
-		elif self.type == TokenType.LBRACKET:
-			return "<[>"
-		elif self.type == TokenType.RBRACKET:
-			return "<]>"
-		elif self.type == TokenType.COMMA:
-			return "<,>"
-		elif self.type == TokenType.COLON:
-			return "<:>"
-		elif self.type == TokenType.TRUE:
-			return "<true>"
-		elif self.type == TokenType.FALSE:
-			return "<false>"
-		elif self.type == TokenType.NULL:
-			return "<NULL>"
-		elif self.type == TokenType.EOF:
-			return "<EOF>"
-		else:
-			return f"<{self.type}>"
+# The parser can either read tokens from a token file written by the scanner (format given in README)
+# or take them directly from the scanner, see parse_text and parse_file at the bottom.
+import mmap
+import struct
+import sys
+
+from scanner import CHUNK_SIZE, MAX_SYMBOLS, SYMBOL_LENGTH, make_lexer, profiled_lexer, tokenize_file
+from diagnostics import Diagnostics
+from profiling import Profile, report_file_name
+from tokens import TokenType, Token, dump_tokens, BINARY_MAGIC, BINARY_VERSION, LONG_LENGTH, CODE_TYPES
+
+
+# Kinds of AST nodes
+KIND_VALUE = 0
+KIND_DICT = 1
+KIND_LIST = 2
+KIND_PAIR = 3
+KIND_PUNCTUATION = 4
+KIND_STRING = 5
+KIND_NUMBER = 6
+KIND_TRUE = 7
+KIND_FALSE = 8
+KIND_NULL = 9
+KIND_INVALID_STRING = 10
+KIND_INVALID_NUMBER = 11
+KIND_INVALID_BOOLEAN = 12
+
+# Most tokens read between two stops of Parser.value_steps besides one per entry of its stack (the comma or closing
+# bracket after every container the value ends): the token after the value and the key and colon of the next pair
+MAX_STEP_TOKENS = 3
+
+# Labels printed for each kind, the value is added after the label for leaves that have one
+KIND_LABELS = {
+	KIND_VALUE: "value",
+	KIND_DICT: "dict",
+	KIND_LIST: "list",
+	KIND_PAIR: "pair",
+	KIND_STRING: "STRING: ",
+	KIND_NUMBER: "NUMBER: ",
+	KIND_TRUE: "BOOLEAN: TRUE",
+	KIND_FALSE: "BOOLEAN: FALSE",
+	KIND_NULL: "BOOLEAN: NULL",
+	KIND_INVALID_STRING: "Invalid String: ",
+	KIND_INVALID_NUMBER: "INVALID NUMBER: ",
+	KIND_INVALID_BOOLEAN: "Invalid Boolean: ",
+}
+VALUE_KINDS = (KIND_STRING, KIND_NUMBER, KIND_INVALID_STRING, KIND_INVALID_NUMBER, KIND_INVALID_BOOLEAN)
+# Kinds that count as the same type for the list type check (semantic Type 6), true, false and null are all booleans
+CONSISTENCY_KINDS = {KIND_FALSE: KIND_TRUE, KIND_NULL: KIND_TRUE}
+# Keys and strings that may not be used (semantic Types 4 and 7)
+RESERVED_KEYS = frozenset(["\"false\"", "\"true\"", "\"null\"", "false", "true", "NULL"])
+
+
+# Label of a node as printed in the AST
+def node_label(kind, value=None):
+	if kind == KIND_PUNCTUATION:
+		return value
+	if kind in VALUE_KINDS:
+		return KIND_LABELS[kind] + str(value)
+	return KIND_LABELS[kind]
 
 
 class Node:
 	# Same implementation as example code
-	def __init__(self, label=None, is_leaf=False):
+	def __init__(self, label=None, is_leaf=False, kind=None, value=None):
 		self.label = label
 		self.children = []
 		self.is_leaf = is_leaf
+		# Kind of node and the token value for leaves, see KIND_*
+		self.kind = kind
+		self.value = value
 	
 	def add_child(self, child):
 		self.children.append(child)
 	
 	def print_tree(self, depth=0, outputfile=""):
-		indent = " " * depth * 3
-		
-		if self.is_leaf:
-			print(f"{indent}{self.label}")
-			print(f"{indent}{self.label}", file=outputfile)
-		else:
-			print(f"{indent}{self.label}", file=outputfile)
-			print(f"{indent}{self.label if self.label else '(none)'}")
-			for child in self.children:
-				child.print_tree(depth + 1, outputfile)
-
-class SemanticError:
-	def __init__(self, file):
-		# The output file
-		self.file = file
-	
-	def log(self, message):
-		# Print to file and to console
-		print(message)
-		print(message, file=self.file)
-	
-	# Types of errors by level
-	def TypeCError(self, message):
-		self.log("Level C Semantic Error: " + message)
-	
-	def TypeBError(self, message):
-		self.log("Level B Semantic Error: " + message)
-	
-	def TypeAError(self, message):
-		self.log("Level A Semantic Error: " + message)
+		# Writes the tree to outputfile and the console, see write_tree
+		write_tree(self, outputfile, True, depth)
 	
-class ParserError:
-	def __init__(self, token=None, error_type="", error="", file_name=""):
-		
-		self.token = token
-		self.error = error
-		self.file_name = file_name
-		
-		if error_type == "D":
-			self.print_error_dict()
-		elif error_type == "L":
-			self.print_error_list()
-		elif error_type == "P":
-			self.print_error_pair()
-		elif error_type == "V":
-			self.print_error_value()
-		elif error_type == "F":
-			self.print_error_file()
-		elif error_type == "S":
-			self.print_error_string()
-		elif error_type == "N":
-			self.print_error_number()
+	# Children as they are printed
+	def print_children(self):
+		return self.children
+
+
+# Compact AST node used by Parser(compact=True), stores only a kind and the raw token value instead of a label.
+# Punctuation ({ } [ ] , :) is not stored, print_tree puts it back so the output is the same as for Node.
+class CompactNode:
+	# key_index is only set on dicts that were looked up by key, see key_index()
+	__slots__ = ("kind", "value", "children", "key_index")
 	
-	def print_error_dict(self):
-		print(f"Error trying to parse {self.token} in dictionary: {self.error}")
+	def __init__(self, kind, value=None):
+		self.kind = kind
+		self.value = value
+		# Leaves don't get a list of children
+		self.children = None if kind > KIND_PUNCTUATION else []
 	
-	def print_error_list(self):
-		print(f"Error trying to parse {self.token} in list: {self.error}")
+	@property
+	def label(self):
+		return node_label(self.kind, self.value)
 	
-	def print_error_pair(self):
-		print(f"Error trying to parse {self.token} in pair: {self.error}")
+	@property
+	def is_leaf(self):
+		return self.kind > KIND_PUNCTUATION
 	
-	def print_error_value(self):
-		print(f"Error trying to parse {self.token} as value: {self.error}")
+	add_child = Node.add_child
+	print_tree = Node.print_tree
 	
-	def print_error_string(self):
-		print(f"Error trying to parse {self.token} as string: {self.error}")
-		
-	def print_error_number(self):
-		print(f"Error trying to parse {self.token} as number: {self.error}")
-		
-	def print_error_boolean(self):
-		print(f"Error trying to parse {self.token} as boolean: {self.error}")
+	def print_children(self):
+		if self.kind == KIND_DICT:
+			return with_punctuation(self.children, LBRACE_NODE, COMMA_NODE, RBRACE_NODE)
+		if self.kind == KIND_LIST:
+			return with_punctuation(self.children, LBRACKET_NODE, COMMA_NODE, RBRACKET_NODE)
+		if self.kind == KIND_PAIR:
+			return [self.children[0], COLON_NODE] + self.children[1:]
+		return self.children
 	
-	def print_error_file(self):
-		print(f"file: {self.file_name} might be empty")
+	# Pickled as one call of restore_compact_node, much faster than the default for __slots__ classes
+	def __reduce__(self):
+		return restore_compact_node, (self.kind, self.value, self.children)
+
+
+def restore_compact_node(kind, value, children):
+	node = CompactNode.__new__(CompactNode)
+	node.kind = kind
+	node.value = value
+	node.children = children
+	return node
+
+
+# Pair node of every key of a dict node (the first pair if a key is repeated). The index is built the first time it is
+# needed and kept on the node, later lookups are one dict access. incremental.py resets it when it replaces pairs.
+def key_index(node):
+	index = getattr(node, "key_index", None)
+	if index is None:
+		index = {}
+		for pair in node.children:
+			if pair.kind == KIND_PAIR:
+				index.setdefault(pair.children[0].value, pair)
+		node.key_index = index
+	return index
+
+
+# Punctuation nodes shared by all compact trees, only used for printing
+LBRACE_NODE = CompactNode(KIND_PUNCTUATION, "{")
+RBRACE_NODE = CompactNode(KIND_PUNCTUATION, "}")
+LBRACKET_NODE = CompactNode(KIND_PUNCTUATION, "[")
+RBRACKET_NODE = CompactNode(KIND_PUNCTUATION, "]")
+COMMA_NODE = CompactNode(KIND_PUNCTUATION, ",")
+COLON_NODE = CompactNode(KIND_PUNCTUATION, ":")
+
+
+# Children of a dict or list with the opening, separating and closing punctuation put back in
+def with_punctuation(children, opening, separator, closing):
+	result = [opening]
+	for i, child in enumerate(children):
+		if i > 0:
+			result.append(separator)
+		result.append(child)
+	result.append(closing)
+	return result
+
+
+# Number of characters write_tree collects before writing them out
+WRITE_CHARS = 1 << 20
+
+
+# Write the tree in the AST output format to output_file, echo also writes it to the console (that is what print_tree does).
+# The tree is walked with explicit stacks of nodes and their depths instead of recursion, so deep trees can be written.
+# Lines are collected and written once they add up to WRITE_CHARS characters. Indents are cut from one string of spaces
+# that grows with the depth, so deep trees don't keep an indent string for every depth.
+def write_tree(root, output_file, echo=False, depth=0):
+	spaces = ""
+	lines = []
+	console = []
+	size = 0
+	# Two stacks instead of one of (node, depth) tuples, that keeps the garbage collector from walking the tree over and over
+	nodes = [root]
+	depths = [depth]
+	while nodes:
+		node = nodes.pop()
+		depth = depths.pop()
+		width = depth * 3
+		if len(spaces) < width:
+			spaces = " " * max(width, 2 * len(spaces))
+		indent = spaces[:width]
+		label = node.label
+		line = f"{indent}{label}"
+		lines.append(line)
+		size += len(line)
+		if node.is_leaf:
+			if echo:
+				console.append(line)
+		else:
+			if echo:
+				console.append(line if label else indent + "(none)")
+			children = node.print_children()
+			nodes.extend(reversed(children))
+			depths.extend([depth + 1] * len(children))
+		if size >= WRITE_CHARS:
+			write_lines(output_file, lines)
+			write_lines(sys.stdout, console)
+			size = 0
+	write_lines(output_file, lines)
+	write_lines(sys.stdout, console)
+
+
+# Write the lines in one go and empty the list
+def write_lines(output_file, lines):
+	if lines:
+		output_file.write("\n".join(lines) + "\n")
+		lines.clear()
+
 
 # Reverse tokenization (Does what the __repr__ in TokenType does but in reverse
 def tokenize(line):
@@ -179,16 +250,72 @@ def tokenize(line):
 		raise Exception("Unknown type of Token: " + line)
 
 
+# Name of the file the semantic errors of file_name are written to
+def error_file_name(file_name):
+	return file_name[0:-4] + "_errors.txt"
+
+
+# Check if a token file is in the binary format written by scanner.write_binary_tokens
+def is_binary_token_file(file_name):
+	with open(file_name, "rb") as file:
+		return file.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+
+# Read a binary token file, the file is memory mapped and tokens are only decoded as the parser asks for them
+def read_binary_tokens(file_name):
+	with open(file_name, "rb") as file:
+		with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+			header = len(BINARY_MAGIC) + 1
+			if data[:len(BINARY_MAGIC)] != BINARY_MAGIC:
+				raise Exception("Not a binary token file: " + file_name)
+			if data[len(BINARY_MAGIC)] != BINARY_VERSION:
+				raise Exception(f"Unsupported binary token file version {data[len(BINARY_MAGIC)]}: {file_name}")
+			position = header
+			end = len(data)
+			while position < end:
+				type_ = CODE_TYPES[data[position]]
+				position += 1
+				if type_ == TokenType.STRING or type_ == TokenType.NUMBER:
+					length = data[position]
+					position += 1
+					if length == LONG_LENGTH:
+						length = struct.unpack_from("<Q", data, position)[0]
+						position += 8
+					value = data[position:position + length].decode("utf-8")
+					position += length
+					yield Token(type_, value)
+				else:
+					yield Token(type_)
+
+
 class Parser:
-	def __init__(self, file_name=""):
-		# Setting up error file
-		self.semanticError = SemanticError(open(file_name[0:-4] + "_errors.txt", "w"))
+	# compact=True builds the tree out of CompactNodes instead of Nodes
+	# max_depth limits how deeply dicts and lists may be nested (None for no limit), for untrusted input
+	# Errors are recorded in diagnostics, a Diagnostics shared with the lexer or a new one
+	def __init__(self, file_name="", tokens=None, compact=False, max_depth=None, diagnostics=None):
+		self.compact = compact
+		self.max_depth = max_depth
+		self.diagnostics = diagnostics if diagnostics is not None else Diagnostics()
+		# Setting up error file, errors are only printed to console if there is no file name
+		if file_name and self.diagnostics.error_file is None:
+			self.diagnostics.error_file = open(error_file_name(file_name), "w")
 		self.current_token = None
 		self.file_name = file_name
-		self.file = open(file_name, "r")
 		self.index = 0
-		# The tokens from token file
-		self.tokenStream = self.init_tokens()
+		# Set once the token stream is used up, current_token then stays at the last token
+		self.at_end = False
+		# Type of the first element of every list that is being parsed, for checkConsistentType
+		self.list_types = []
+		# Label of the string leaves by value, so that repeated strings (interned by the lexer) share one label
+		self.string_labels = {}
+		# The tokens from token file, unless they are given directly (any iterable, e.g. DFA.iter_tokens())
+		if tokens is None:
+			if is_binary_token_file(file_name):
+				tokens = read_binary_tokens(file_name)
+			else:
+				self.file = open(file_name, "r")
+				tokens = self.init_tokens()
+		self.tokenStream = iter(tokens)
 	
 	def init_tokens(self):
 		tokens = []
@@ -197,15 +324,39 @@ class Parser:
 				tokens.extend(tokenize(line))
 		return tokens
 	
+	# Create a node of the AST
+	def make_node(self, kind, value=None):
+		if self.compact:
+			return CompactNode(kind, value)
+		if kind == KIND_STRING and value is not None:
+			label = self.string_labels.get(value)
+			if label is None:
+				label = node_label(kind, value)
+				if len(self.string_labels) < MAX_SYMBOLS and len(value) <= SYMBOL_LENGTH:
+					self.string_labels[value] = label
+			return Node(label, True, kind, value)
+		return Node(node_label(kind, value), kind > KIND_PUNCTUATION, kind, value)
+	
+	# Punctuation is only added as children in the normal tree
+	def add_punctuation(self, node, label):
+		if not self.compact:
+			node.add_child(Node(label, kind=KIND_PUNCTUATION, value=label))
+	
 	def get_next_token(self):
-		if self.index >= len(self.tokenStream):
+		token = next(self.tokenStream, None)
+		if token is None:
+			self.at_end = True
 			return Token(TokenType.EOF, "<EOF>")
-		self.current_token = self.tokenStream[self.index]
+		self.current_token = token
 		self.index += 1
 	
 	def eat(self, token_type):
 		# Consumes a token if it matches the expected type.
 		if self.current_token.type == token_type:
+			# Reading the same bracket or comma again after the end of the stream would open containers
+			# or read items forever, stop instead
+			if self.at_end and token_type in (TokenType.LBRACE, TokenType.LBRACKET, TokenType.COMMA):
+				raise Exception(f"Unexpected end of Token Stream at position {self.index} after {self.current_token}")
 			self.get_next_token()
 		# Edge case where token isn't same as what is expected, should not happen after error detection
 		else:
@@ -213,128 +364,175 @@ class Parser:
 	
 	def parse(self):
 		# Starts the parsing process by fetching the first token and calling the first grammar rule.
-		self.get_next_token()
-		return self.value()
+		# Errors still waiting in diagnostics are written out at the end, also if parsing stopped with an exception
+		try:
+			self.get_next_token()
+			root = self.value()
+			# Tokens after the value are still read, so that the lexer reports its errors in them like it does when
+			# the whole input is scanned first
+			for _ in self.tokenStream:
+				pass
+			return root
+		finally:
+			self.diagnostics.flush()
+	
+	def value(self, depth=0):
+		steps = self.value_steps(depth)
+		while True:
+			try:
+				next(steps)
+			except StopIteration as done:
+				return done.value
+	
+	def value_steps(self, depth=0):
+		# Parsing value without recursion: the dicts, lists and pairs that are still open are kept on an explicit
+		# stack as [node, number of items added], so the nesting depth is not limited by Python's recursion limit.
+		# A dict on the stack is always followed by the pair that is being parsed in it.
+		# depth is the number of containers around the value, for max_depth when only a part of a document is parsed.
+		# Generator that returns the value: it stops before every value that is started and yields the size of the
+		# stack. Until the next stop at most that many tokens plus MAX_STEP_TOKENS are read, so a parser fed from a
+		# stream (see aio.py) can wait for that many tokens and go on.
+		stack = []
+		while True:
+			yield len(stack)
+			if depth == self.max_depth and self.current_token is not None and self.current_token.type in (TokenType.LBRACE, TokenType.LBRACKET):
+				raise Exception(f"Maximum nesting depth {self.max_depth} exceeded at position {self.index} in Token Stream: {self.current_token}")
+			node = self.value_start()
+			if node.kind == KIND_DICT or node.kind == KIND_LIST:
+				depth += 1
+				stack.append([node, 0])
+				if node.kind == KIND_DICT:
+					stack.append([self.pair_start(), 0])
+				continue
+			# The value is complete, add it to its container and close the containers that are finished with it
+			while stack:
+				frame = stack[-1]
+				parent = frame[0]
+				if parent.kind == KIND_PAIR:
+					parent.add_child(node)
+					stack.pop()
+					node = parent
+					continue
+				if parent.kind == KIND_DICT:
+					more = self.dict_item(parent, node, frame[1] == 0)
+				else:
+					more = self.list_item(parent, node, frame[1] == 0)
+				frame[1] += 1
+				if more:
+					# Comma was read, parse the next item
+					if parent.kind == KIND_DICT:
+						stack.append([self.pair_start(), 0])
+					break
+				stack.pop()
+				depth -= 1
+				node = parent
+			else:
+				return node
 	
-	def value(self):
+	def value_start(self):
 		# Start a node with label set to value since this is the root of parse tree
-		node = Node(label="value")
+		node = self.make_node(KIND_VALUE)
 		# Check for what the token type is and perform operations accordingly
+		# Dicts and lists are only opened here, value() parses their items
 		if self.current_token is None:
 			return node
 		# If token is not none, then it can only be one of the following if syntax is correct
-		elif self.current_token is not None:
-			if self.current_token.type == TokenType.NUMBER:
-				node.add_child(self.number())
-			elif self.current_token.type == TokenType.STRING:
-				node.add_child(self.string())
-			elif self.current_token.type == TokenType.LBRACE:
-				return self.dict()
-			elif self.current_token.type == TokenType.LBRACKET:
-				return self.list()
-			elif self.current_token.type == TokenType.TRUE:
-				node.add_child(self.true())
-			elif self.current_token.type == TokenType.FALSE:
-				node.add_child(self.false())
-			elif self.current_token.type == TokenType.NULL:
-				node.add_child(self.null())
-			elif self.current_token.type == TokenType.EOF:
-				return node
-			else:
-				ParserError(self.current_token, "V", f"Unexpected Token at position {self.index}: {self.current_token}. Datatype should start with opening brackets or should be a terminal")
+		if self.current_token.type == TokenType.NUMBER:
+			node.add_child(self.number())
+		elif self.current_token.type == TokenType.STRING:
+			node.add_child(self.string())
+		elif self.current_token.type == TokenType.LBRACE:
+			return self.dict_start()
+		elif self.current_token.type == TokenType.LBRACKET:
+			return self.list_start()
+		elif self.current_token.type == TokenType.TRUE:
+			node.add_child(self.true())
+		elif self.current_token.type == TokenType.FALSE:
+			node.add_child(self.false())
+		elif self.current_token.type == TokenType.NULL:
+			node.add_child(self.null())
+		elif self.current_token.type == TokenType.EOF:
+			return node
 		else:
-			ParserError(self.current_token,"F", "Unexpected error", self.file_name)
+			self.diagnostics.parser_error("V", "value", self.index, self.current_token)
 		return node
 	
-	def dict(self):
+	def dict_start(self):
 		# Parsing dict: "{" pair (", " pair)* "}"
-		node = Node(label="dict")
+		node = self.make_node(KIND_DICT)
 		
-		# First LBRACE is read
-		node.add_child(Node(label="{"))
+		# First LBRACE is read, then value() reads the pairs
+		self.add_punctuation(node, "{")
 		self.eat(TokenType.LBRACE)
-		
-		# Then you read a pair
-		pair = self.pair()
+		return node
+	
+	def dict_item(self, node, pair, first):
+		# Add a pair to the dict, returns True if another pair follows
 		node.add_child(pair)
 		
-		if self.current_token.type != TokenType.COMMA and self.current_token.type != TokenType.RBRACE:
-			ParserError(self.current_token, "D", f"Missing <,> at {self.index} in Token Stream or unexpected token: {self.current_token}")
+		if first and self.current_token.type != TokenType.COMMA and self.current_token.type != TokenType.RBRACE:
+			self.diagnostics.parser_error("D", "dict_comma", self.index, self.current_token)
 		
 		# Continue reading pairs until no more input(Last comma is read)
-		while self.current_token.type == TokenType.COMMA:
-			node.add_child(Node(label=","))
-			if self.current_token.type == TokenType.COMMA:
-				self.eat(TokenType.COMMA)
-			else:
-				# Error should never happen because of while loop conditions but just in case
-				ParserError(self.current_token, "D", f"<,> Missing at position {self.index} in Token Stream or unexpected token: {self.current_token}")
-			pair = self.pair()
-			node.add_child(pair)
+		if self.current_token.type == TokenType.COMMA:
+			self.add_punctuation(node, ",")
+			self.eat(TokenType.COMMA)
+			return True
 		
 		# Finish with RBRACE and error correction
 		if self.current_token.type == TokenType.RBRACE:
 			self.eat(TokenType.RBRACE)
 		else:
-			ParserError(self.current_token, "D", "Missing <}> " + f"at position {self.index} in Token Stream or unexpected token: {self.current_token}")
-		node.add_child(Node(label="}"))
-		return node
+			self.diagnostics.parser_error("D", "dict_end", self.index, self.current_token)
+		self.add_punctuation(node, "}")
+		return False
 	
-	def list(self):
+	def list_start(self):
 		# Parsing list: "[" value (", " value)* "]"
-		node = Node(label="list")
-		all_values = []
+		node = self.make_node(KIND_LIST)
 		
-		# Start with LBRACKET
-		node.add_child(Node(label="["))
+		# Start with LBRACKET, then value() reads the values
+		self.add_punctuation(node, "[")
 		self.eat(TokenType.LBRACKET)
-		
-		# Add first value into list
-		value = self.value()
-		all_values.append(value)
+		self.list_types.append(None)
+		return node
+	
+	def list_item(self, node, value, first):
+		# Add a value to the list, returns True if another value follows
 		node.add_child(value)
+		self.checkConsistentType(value)
 		
-		if self.current_token.type != TokenType.COMMA and self.current_token.type != TokenType.RBRACKET:
-			ParserError(self.current_token, "L", f"Missing <,> at position {self.index} in Token Stream or unexpected token: {self.current_token}")
+		if first and self.current_token.type != TokenType.COMMA and self.current_token.type != TokenType.RBRACKET:
+			self.diagnostics.parser_error("L", "list_comma", self.index, self.current_token)
 		
-		# Similar to Dictionary, read until commas finish and add all values read
-		while self.current_token.type == TokenType.COMMA:
-			node.add_child(Node(label=","))
-			if self.current_token.type == TokenType.COMMA:
-				self.eat(TokenType.COMMA)
-			else:
-				# Error should never happen because of while loop conditions but just in case
-				ParserError(self.current_token, "L", f"<,> Missing at position {self.index} in Token Stream or unexpected token: {self.current_token}")
-			value = self.value()
-			all_values.append(value)
-			node.add_child(value)
+		# Similar to Dictionary, read until commas finish
+		if self.current_token.type == TokenType.COMMA:
+			self.add_punctuation(node, ",")
+			self.eat(TokenType.COMMA)
+			return True
 		
 		# Finish with RBRACKET and error correction
 		if self.current_token.type == TokenType.RBRACKET:
 			self.eat(TokenType.RBRACKET)
 		else:
-			ParserError(self.current_token, "L", "<]> " + f"Missing at position {self.index} in Token Stream or unexpected token: {self.current_token}")
-		node.add_child(Node(label="]"))
-		return node
+			self.diagnostics.parser_error("L", "list_end", self.index, self.current_token)
+		self.add_punctuation(node, "]")
+		self.list_types.pop()
+		return False
 	
-	def pair(self):
-		# Parsing pair: STRING " : " value
-		node = Node(label="pair")
+	def pair_start(self):
+		# Parsing pair: STRING " : " value, value() adds the value
+		node = self.make_node(KIND_PAIR)
 		
 		# Get first string
 		key = self.string("p")
 		node.add_child(key)
-		node.add_child(Node(label=":"))
+		self.add_punctuation(node, ":")
 		
 		if self.current_token.type == TokenType.COLON:
 			self.eat(TokenType.COLON)
 		else:
-			ParserError(self.current_token, "P", f"<:> missing at {self.index} in Token Stream or unexpected token: {self.current_token}")
-		
-		# Get second value
-		value = self.value()
-		node.add_child(value)
-		
+			self.diagnostics.parser_error("P", "pair_colon", self.index, self.current_token)
 		return node
 	
 	# Parsing Terminals (leaves of the tree)
@@ -346,25 +544,25 @@ class Parser:
 			value = self.current_token.value
 			self.checkValidPair(value)
 			self.checkReservedKeys(value)
-			node = Node(label="STRING: " + str(value), is_leaf=True)
+			node = self.make_node(KIND_STRING, value)
 			# If current token is not a string, log error
 			if self.current_token.type == TokenType.STRING:
 				self.eat(TokenType.STRING)
 			else:
-				self.semanticError.TypeBError(f"Type 4 at {self.current_token}: Reserved Words as Dictionary Key")
+				self.diagnostics.semantic_error("B", 4, self.index, self.current_token)
 				self.eat(self.current_token.type)
 			return node
 		else:
 			value = self.current_token.value
 			#Should never happen but in case this method is called for a type other than String
 			if self.current_token.type == TokenType.STRING:
-				node = Node(label="STRING: " + value, is_leaf=True)
+				node = self.make_node(KIND_STRING, value)
 				self.eat(TokenType.STRING)
 				return node
 			else:
-				ParserError(self.current_token, "S", f"Unexpected Token at {self.index}: {self.current_token}")
+				self.diagnostics.parser_error("S", "unexpected", self.index, self.current_token)
 				self.eat(self.current_token.type)
-				return Node("Invalid String: " + str(value), is_leaf=True)
+				return self.make_node(KIND_INVALID_STRING, value)
 	
 	def number(self):
 		# Parsing Numbers(Both Integer and Float)
@@ -374,110 +572,193 @@ class Parser:
 			self.checkValidDecimal()
 			# Should never happen but in case this method is called for a type other than String
 			if self.current_token.type == TokenType.NUMBER:
-				node = Node(label="NUMBER: " + str(value), is_leaf=True)
+				node = self.make_node(KIND_NUMBER, value)
 				self.eat(TokenType.NUMBER)
 				return node
 			else:
-				ParserError(self.current_token, "N", f"Unexpected Token at {self.index}: {self.current_token}")
+				self.diagnostics.parser_error("N", "unexpected", self.index, self.current_token)
 				self.eat(self.current_token.type)
-				return Node(label="INVALID NUMBER: " + str(value), is_leaf=True)
+				return self.make_node(KIND_INVALID_NUMBER, value)
 		else:
 			# Check for Int format
 			self.checkValidInteger()
 			# Should never happen but in case this method is called for a type other than String
 			if self.current_token.type == TokenType.NUMBER:
-				node = Node(label="NUMBER: " + str(value), is_leaf=True)
+				node = self.make_node(KIND_NUMBER, value)
 				self.eat(TokenType.NUMBER)
 				return node
 			else:
-				ParserError(self.current_token, "N", f"Unexpected Token at {self.index}: {self.current_token}")
+				self.diagnostics.parser_error("N", "unexpected", self.index, self.current_token)
 				self.eat(self.current_token.type)
-				return Node(label="INVALID NUMBER: " + str(value), is_leaf=True)
+				return self.make_node(KIND_INVALID_NUMBER, value)
 		
 	
 	def true(self):
 		# Parsing true boolean
 		if self.current_token.type == TokenType.TRUE:
 			self.eat(TokenType.TRUE)
-			return Node(label="BOOLEAN: TRUE", is_leaf=True)
+			return self.make_node(KIND_TRUE)
 		else:
-			ParserError(self.current_token, "B", f"Expected <true>, got: {self.current_token}")
+			self.diagnostics.parser_error("B", "true", self.index, self.current_token)
 			value = self.current_token.value
 			self.eat(self.current_token.type)
-			return Node(label="Invalid Boolean: " + str(value), is_leaf=True)
+			return self.make_node(KIND_INVALID_BOOLEAN, value)
 			
 	
 	def false(self):
 		# Parsing false boolean
 		if self.current_token.type == TokenType.FALSE:
 			self.eat(TokenType.FALSE)
-			return Node(label="BOOLEAN: FALSE", is_leaf=True)
+			return self.make_node(KIND_FALSE)
 		else:
-			ParserError(self.current_token, "B", f"Expected <false>, got: {self.current_token}")
+			self.diagnostics.parser_error("B", "false", self.index, self.current_token)
 			value = self.current_token.value
 			self.eat(self.current_token.type)
-			return Node(label="Invalid Boolean: " + str(value), is_leaf=True)
+			return self.make_node(KIND_INVALID_BOOLEAN, value)
 	
 	def null(self):
 		# Parsing null "boolean"
 		if self.current_token.type == TokenType.NULL:
 			self.eat(TokenType.NULL)
-			return Node(label="BOOLEAN: NULL", is_leaf=True)
+			return self.make_node(KIND_NULL)
 		else:
-			ParserError(self.current_token, "B", f"Expected <null>, got: {self.current_token}")
+			self.diagnostics.parser_error("B", "null", self.index, self.current_token)
 			value = self.current_token.value
 			self.eat(self.current_token.type)
-			return Node(label="Invalid Boolean: " + str(value), is_leaf=True)
+			return self.make_node(KIND_INVALID_BOOLEAN, value)
 	
 	#All the methods to check for validity or throw errors for Part 3
 	def checkValidDecimal(self):
 		Num = self.current_token.value.split(".")
 		if len(Num[1]) <= 0 or len(Num[0]) <= 0:
-			self.semanticError.TypeCError(f"Type 1 at {self.current_token}: Invalid Decimal Numbers")
+			self.diagnostics.semantic_error("C", 1, self.index, self.current_token)
 			return False
 		else:
 			return True
 
 	def checkValidPair(self, Key):
 		if Key is None or Key.strip() == "" or Key == "\"\"":
-			self.semanticError.TypeCError(f"Type 2 at {self.current_token}: Empty Key")
+			self.diagnostics.semantic_error("C", 2, self.index, self.current_token)
 			return False
 		else:
 			return True
 
 	def checkValidInteger(self):
 		if self.current_token.value[0] in ["0", "+"]:
-			self.semanticError.TypeBError(f"Type 3 at {self.current_token}: Invalid Numbers")
+			self.diagnostics.semantic_error("B", 3, self.index, self.current_token)
 
 	def checkReservedKeys(self, Key, Type="B"):
 		if Type == "B":
-			if Key in ["\"false\"", "\"true\"", "\"null\"", "false", "true", "NULL"]:
-				self.semanticError.TypeBError(f"Type 4 at {self.current_token}: Reserved Words as Dictionary Key")
+			if Key in RESERVED_KEYS:
+				self.diagnostics.semantic_error("B", 4, self.index, self.current_token)
 				return False
 		else:
-			if Key in ["\"false\"", "\"true\"", "\"null\"", "false", "true", "NULL"]:
-				self.semanticError.TypeAError(f"Type 7 at {self.current_token}: Reserved Words as Strings")
+			if Key in RESERVED_KEYS:
+				self.diagnostics.semantic_error("A", 7, self.index, self.current_token)
 				return False
 		return True
 
-	def checkConsistentType(self, valueNodes):
-		type = valueNodes.pop(0).children.pop(0).label
-		while valueNodes:
-			node = valueNodes.pop(0).children.pop(0)
-			value = node.label[0:3]
-			if type[0:3] != value:
-				# Basically just check first three letters of label, which should contain (NUMBERS), (STRING) or another value. If they don't match then problem
-				self.semanticError.TypeAError(f"Type 6 at <{node.label}> (Expected Type: {type[:3]}): Inconsistent Types for List Elements")
-				return False
-		return True
+	def checkConsistentType(self, value):
+		# Called for every element of a list as it is added: the kind of every element should be that of the first one.
+		# Only the first element that differs is reported, after that the list is marked with False.
+		node = self.element_node(value)
+		if node is None:
+			return True
+		kind = CONSISTENCY_KINDS.get(node.kind, node.kind)
+		expected = self.list_types[-1]
+		if expected is None:
+			self.list_types[-1] = kind
+			return True
+		if expected is False or expected == kind:
+			return True
+		self.diagnostics.semantic_error("A", 6, self.index, f"<{node_label(node.kind, node.value)}>", KIND_LABELS[expected][:3])
+		self.list_types[-1] = False
+		return False
+	
+	# Node that gives the type of a list element: the leaf of a value, or the dict or list itself. None for a missing value.
+	def element_node(self, value):
+		if value.kind != KIND_VALUE:
+			return value
+		return value.children[0] if value.children else None
+
+# Parse tokens coming straight from the scanner (any iterable of Token).
+# file_name is only used to name the error file. dump_file_name optionally writes the token file as well (for debugging).
+# compact builds the tree out of CompactNodes, max_depth limits the nesting depth (see Parser).
+# Errors are recorded in diagnostics, if none is given a new one is used and closed at the end.
+# profile is an optional profiling.Profile that the parser is attached to.
+def parse_tokens(tokens, file_name="", dump_file_name="", compact=False, max_depth=None, diagnostics=None, profile=None):
+	dump_file = None
+	if dump_file_name:
+		dump_file = open(dump_file_name, "w")
+		tokens = dump_tokens(tokens, dump_file)
+	theParser = Parser(file_name, tokens, compact, max_depth, diagnostics)
+	if profile is not None:
+		profile.attach_parser(theParser)
+	try:
+		root = theParser.parse()
+		if dump_file is not None:
+			dump_file.close()
+	finally:
+		if diagnostics is None:
+			theParser.diagnostics.close()
+	return root
+
+
+# Scan and parse input text in one go, tokens go straight from the DFA into the Parser.
+# fast uses the FastDFA lexer instead of the DFA, indexed the IndexedDFA. The lexer and the parser share one Diagnostics.
+# Pass a scanner.SymbolTable as symbols to intern the string values and see the strings and their counts afterwards.
+def parse_text(input_text, file_name="", dump_file_name="", fast=False, compact=False, max_depth=None, diagnostics=None, profile=None, indexed=False, symbols=None):
+	shared = diagnostics if diagnostics is not None else Diagnostics()
+	try:
+		lexer = profiled_lexer(make_lexer(input_text, fast, shared, indexed, symbols), profile)
+		return parse_tokens(lexer.iter_tokens(), file_name, dump_file_name, compact, max_depth, shared, profile)
+	finally:
+		if diagnostics is None:
+			shared.close()
+
+
+# Same as parse_text but streams the input from a file in chunks. Errors are written to <file>_errors.txt
+def parse_file(file_name, dump_file_name="", chunk_size=CHUNK_SIZE, use_mmap=False, fast=False, compact=False, max_depth=None, diagnostics=None, profile=None, indexed=False, symbols=None):
+	shared = diagnostics if diagnostics is not None else Diagnostics()
+	try:
+		tokens = tokenize_file(file_name, chunk_size, use_mmap, fast, shared, profile, indexed, symbols)
+		return parse_tokens(tokens, file_name, dump_file_name, compact, max_depth, shared, profile)
+	finally:
+		if diagnostics is None:
+			shared.close()
+
 
 # Main
+# python parser.py [--binary] [--compact] [--quiet] [--max-errors N] [--no-echo] [--profile]
+# --binary reads the binary token files test_input_parser_X.tok written by python scanner.py --binary
+# --compact builds the AST out of CompactNodes
+# --quiet only writes the errors to the error files, --max-errors N stops recording errors after N
+# --no-echo only writes the AST to the output files and not to the console
+# --profile writes a profiling report next to every AST output file (test_AST_output_X_profile.json)
 if __name__ == "__main__":
+	extension = ".tok" if "--binary" in sys.argv[1:] else ".txt"
+	compact = "--compact" in sys.argv[1:]
+	quiet = "--quiet" in sys.argv[1:]
+	echo = "--no-echo" not in sys.argv[1:]
+	profiling = "--profile" in sys.argv[1:]
+	max_errors = int(sys.argv[sys.argv.index("--max-errors") + 1]) if "--max-errors" in sys.argv[1:] else None
 	for i in range(1, 4):
-		file_name = "test_input_parser_" + str(i) + ".txt"
+		file_name = "test_input_parser_" + str(i) + extension
 		print("Parsing file: " + file_name)
-		theParser = Parser(file_name)
+		diagnostics = Diagnostics(quiet=quiet, max_errors=max_errors)
+		theParser = Parser(file_name, compact=compact, diagnostics=diagnostics)
+		profile = Profile() if profiling else None
+		if profile is not None:
+			profile.attach_parser(theParser)
 		theJSONOutput = theParser.parse()
-		outputFile = open(file_name[0:4] + "_AST_output_" + str(i) + ".txt", "w")
-		theJSONOutput.print_tree(outputfile=outputFile)
-		print("------ File " + file_name + " Parsed!------\n")
\ No newline at end of file
+		diagnostics.close()
+		output_file_name = file_name[0:4] + "_AST_output_" + str(i) + ".txt"
+		outputFile = open(output_file_name, "w")
+		if profile is not None:
+			with profile.phase("output"):
+				write_tree(theJSONOutput, outputFile, echo)
+			profile.write_report(report_file_name(output_file_name))
+		else:
+			write_tree(theJSONOutput, outputFile, echo)
+		outputFile.close()
+		print("------ File " + file_name + " Parsed!------\n")
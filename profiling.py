@@ -0,0 +1,157 @@
+# Opt-in profiling of the scanner and the parser.
+# Nothing is instrumented unless a Profile is attached: attach_lexer and attach_parser replace the hot methods of that
+# one lexer/parser object with timing wrappers, so the classes themselves (and every run without a Profile) are unchanged.
+# profile = Profile()
+# root = parse_text(text, profile=profile)    # or parse_file(..., profile=profile)
+# with profile.phase("output"):
+#     write_tree(root, output_file)
+# profile.report() / profile.write_report("test_AST_output_1_profile.json")
+import json
+import time
+from contextlib import contextmanager
+
+from diagnostics import LEXER, PARSER, SEMANTIC
+
+# Parser methods that are timed
+GRAMMAR_METHODS = ("value", "value_start", "dict_start", "dict_item", "list_start", "list_item", "pair_start")
+CHECK_METHODS = ("checkValidDecimal", "checkValidPair", "checkValidInteger", "checkReservedKeys", "checkConsistentType")
+
+
+class Profile:
+	def __init__(self):
+		# Number of calls and total time (including the methods they call) by method name
+		self.calls = {}
+		self.seconds = {}
+		# Time of the phases timed with phase()
+		self.phases = {}
+		# Tokens read by the parser by TokenType
+		self.token_counts = {}
+		# AST nodes created, punctuation nodes included
+		self.nodes = 0
+		# Current and maximum nesting depth of dicts and lists
+		self.depth = 0
+		self.max_depth = 0
+		# Diagnostics of the attached parsers, errors are counted from them in report()
+		self.diagnostics = []
+
+	# Replace obj.name with a wrapper that counts and times the calls. after(result) is called with every result.
+	def wrap(self, obj, name, key, after=None):
+		method = getattr(obj, name)
+		calls = self.calls
+		seconds = self.seconds
+		calls.setdefault(key, 0)
+		seconds.setdefault(key, 0.0)
+		clock = time.perf_counter
+
+		def wrapper(*args):
+			start = clock()
+			try:
+				result = method(*args)
+			finally:
+				seconds[key] += clock() - start
+				calls[key] += 1
+			if after is not None:
+				after(result)
+			return result
+		setattr(obj, name, wrapper)
+
+	def attach_lexer(self, lexer):
+		self.wrap(lexer, "get_next_token", type(lexer).__name__ + ".get_next_token")
+
+	def attach_parser(self, theParser):
+		self.diagnostics.append(theParser.diagnostics)
+
+		# Index of the last token counted, get_next_token leaves current_token alone at the end of the stream
+		counted = [theParser.index]
+
+		def count_token(result):
+			if theParser.index != counted[0]:
+				counted[0] = theParser.index
+				type_ = theParser.current_token.type
+				self.token_counts[type_] = self.token_counts.get(type_, 0) + 1
+
+		def count_node(result):
+			self.nodes += 1
+
+		def count_punctuation(result):
+			if not theParser.compact:
+				self.nodes += 1
+
+		def open_container(result):
+			self.depth += 1
+			self.max_depth = max(self.max_depth, self.depth)
+
+		def close_container(more):
+			if not more:
+				self.depth -= 1
+
+		self.wrap(theParser, "parse", "Parser.parse")
+		self.wrap(theParser, "get_next_token", "Parser.get_next_token", count_token)
+		self.wrap(theParser, "eat", "Parser.eat")
+		self.wrap(theParser, "make_node", "Parser.make_node", count_node)
+		self.wrap(theParser, "add_punctuation", "Parser.add_punctuation", count_punctuation)
+		for name in GRAMMAR_METHODS:
+			if name in ("dict_start", "list_start"):
+				after = open_container
+			elif name in ("dict_item", "list_item"):
+				after = close_container
+			else:
+				after = None
+			self.wrap(theParser, name, "Parser." + name, after)
+		for name in CHECK_METHODS:
+			self.wrap(theParser, name, "Parser." + name)
+
+	# Time a phase that is not covered by the wrapped methods, e.g. writing the AST
+	@contextmanager
+	def phase(self, name):
+		start = time.perf_counter()
+		try:
+			yield self
+		finally:
+			self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+	# Errors by level (A, B, C) and by source (lexer, parser) in the attached diagnostics
+	def error_counts(self):
+		counts = {"A": 0, "B": 0, "C": 0, LEXER: 0, PARSER: 0}
+		seen = set()
+		for diagnostics in self.diagnostics:
+			# The lexer and the parser can share one Diagnostics
+			if id(diagnostics) in seen:
+				continue
+			seen.add(id(diagnostics))
+			for entry in diagnostics.entries:
+				key = entry.level if entry.source == SEMANTIC else entry.source
+				counts[key] += 1
+		return counts
+
+	# Wall time by phase: scanning, semantic checks, the rest of parsing, and the phases timed with phase()
+	def phase_seconds(self):
+		scan = sum(seconds for key, seconds in self.seconds.items() if key.endswith("DFA.get_next_token"))
+		semantic = sum(self.seconds.get("Parser." + name, 0.0) for name in CHECK_METHODS)
+		phases = {"scan": scan, "semantic": semantic}
+		if "Parser.parse" in self.seconds:
+			phases["parse"] = self.seconds["Parser.parse"] - scan - semantic
+		phases.update(self.phases)
+		return phases
+
+	# All statistics as a dict
+	def report(self):
+		return {
+			"phases": self.phase_seconds(),
+			"methods": {key: {"calls": self.calls[key], "seconds": self.seconds[key]} for key in self.calls},
+			"tokens": dict(self.token_counts),
+			"nodes": self.nodes,
+			"max_depth": self.max_depth,
+			"errors": self.error_counts(),
+		}
+
+	def write_report(self, file_name):
+		with open(file_name, "w") as file:
+			json.dump(self.report(), file, indent=2)
+
+
+# Name of the profile report written next to an AST output file
+def report_file_name(ast_file_name):
+	if ast_file_name.endswith(".txt"):
+		ast_file_name = ast_file_name[0:-4]
+	return ast_file_name + "_profile.json"
@@ -0,0 +1,164 @@
+# Path queries over parsed documents (the AST of Parser, Node or CompactNode trees).
+# query = compile_path("$.users[*].id")
+# nodes = query.find(root)                   # matching nodes in document order, query.first(root) for the first one
+# for i, nodes in query.find_many(roots):   # one compiled query over many documents
+#     ...
+# Paths start with $ (the root) followed by steps:
+#   .key or ["key"]    value of a key in a dict (the first pair with that key)
+#   [n]                item n of a list, negative n counts from the end
+#   .* or [*]          every value of a dict or item of a list
+#   ..key, ..[n], ..*  the step applied to the value and everything below it (a value below two nodes the steps
+#                      before matched, as in $..a..b, is found for each of them)
+# Values are the nodes of the tree: a dict or list node, or a value node with the leaf (STRING, NUMBER, ...) as child.
+# Keys are looked up in the index kept on every dict node (see parser.key_index), so only the first lookup in a dict
+# goes over its pairs. Steps that don't match (a key on a list, an index out of range) give no result.
+import re
+
+from parser import CompactNode, KIND_DICT, KIND_LIST, key_index
+
+# Compiled queries kept by path text
+MAX_QUERIES = 1024
+# One step: dots and a name or *, or dots and a bracket with *, an index or a quoted key
+STEP = re.compile(r'(\.\.?)(\*|[^.\[\]\s]+)|(\.\.)?\[\s*(?:(\*)|(-?[0-9]+)|"([^"]*)"|\'([^\']*)\')\s*\]')
+# Kinds of steps
+STEP_KEY = 0
+STEP_INDEX = 1
+STEP_ALL = 2
+
+compiled_queries = {}
+
+
+class Query:
+	# steps is a list of (kind, argument, descend), see compile_path
+	def __init__(self, path, steps):
+		self.path = path
+		self.steps = steps
+
+	def __repr__(self):
+		return f"Query({self.path!r})"
+
+	# Nodes matching the path in the tree below root
+	def find(self, root):
+		nodes = [root]
+		for kind, argument, descend in self.steps:
+			matches = []
+			for node in nodes:
+				if descend:
+					step_below(node, kind, argument, matches)
+				else:
+					step(node, kind, argument, matches)
+			nodes = matches
+			if not nodes:
+				break
+		return nodes
+
+	# First node matching the path, None if there is none
+	def first(self, root):
+		nodes = self.find(root)
+		return nodes[0] if nodes else None
+
+	# Run the query over many trees, yields (index of the tree, matching nodes)
+	def find_many(self, roots):
+		for i, root in enumerate(roots):
+			yield i, self.find(root)
+
+
+# Compile a path (see above), raises an Exception if it is not valid. Compiled queries are kept and reused.
+def compile_path(path):
+	query = compiled_queries.get(path)
+	if query is not None:
+		return query
+	text = path.strip()
+	if not text.startswith("$"):
+		raise Exception(f"Path has to start with $: {path}")
+	steps = []
+	position = 1
+	while position < len(text):
+		match = STEP.match(text, position)
+		if match is None:
+			raise Exception(f"Invalid path step at position {position} in {path}")
+		dots, name, bracket_dots, star, index, key, quoted_key = match.groups()
+		descend = (dots or bracket_dots) == ".."
+		if name == "*" or star is not None:
+			steps.append((STEP_ALL, None, descend))
+		elif index is not None:
+			steps.append((STEP_INDEX, int(index), descend))
+		else:
+			steps.append((STEP_KEY, next(part for part in (name, key, quoted_key) if part is not None), descend))
+		position = match.end()
+	query = Query(path, steps)
+	if len(compiled_queries) < MAX_QUERIES:
+		compiled_queries[path] = query
+	return query
+
+
+# Nodes matching path in the tree below root
+def find(path, root):
+	return compile_path(path).find(root)
+
+
+# Run path over many trees, yields (index of the tree, matching nodes)
+def find_many(path, roots):
+	return compile_path(path).find_many(roots)
+
+
+# Values of a dict or items of a list, nothing for other nodes. Nodes have punctuation children between the items
+# unless they are compact: [ item , item ... ] and { pair , pair ... }
+def node_items(node):
+	if node.kind != KIND_DICT and node.kind != KIND_LIST:
+		return []
+	items = node.children if isinstance(node, CompactNode) else node.children[1:-1:2]
+	if node.kind == KIND_DICT:
+		return [pair.children[-1] for pair in items]
+	return items
+
+
+# Item i of a list node, None if there is none
+def list_item_at(node, i):
+	children = node.children
+	if isinstance(node, CompactNode):
+		count = len(children)
+	else:
+		count = (len(children) - 1) // 2
+	if i < 0:
+		i += count
+	if i < 0 or i >= count:
+		return None
+	return children[i] if isinstance(node, CompactNode) else children[2 * i + 1]
+
+
+# Add the nodes one step matches in node to matches
+def step(node, kind, argument, matches):
+	if kind == STEP_KEY:
+		if node.kind == KIND_DICT:
+			pair = key_index(node).get(argument)
+			if pair is not None:
+				matches.append(pair.children[-1])
+	elif kind == STEP_INDEX:
+		if node.kind == KIND_LIST:
+			item = list_item_at(node, argument)
+			if item is not None:
+				matches.append(item)
+	else:
+		matches.extend(node_items(node))
+
+
+# Add the nodes a step matches in node and every dict and list below it to matches, in document order: the items of
+# a dict or list are gone through in order, an item is added if the step matches it and then the nodes below it follow
+def step_below(node, kind, argument, matches):
+	# (node, True if the step matched it in its parent)
+	stack = [(node, False)]
+	while stack:
+		node, matched = stack.pop()
+		if matched:
+			matches.append(node)
+		if node.kind != KIND_DICT and node.kind != KIND_LIST:
+			continue
+		found = []
+		step(node, kind, argument, found)
+		every = kind == STEP_ALL
+		target = found[0] if found else None
+		for item in reversed(node_items(node)):
+			matched = every or item is target
+			if matched or item.kind == KIND_DICT or item.kind == KIND_LIST:
+				stack.append((item, matched))
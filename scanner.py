@@ -1,86 +1,82 @@
-# Token types
-class TokenType:
-	STRING = 'STRING'  # String datatype
-	NUMBER = 'NUMBER'  # numeric datatype
-	EOF = 'EOF'  # End of file(End of input)
-	NULL = 'NULL'  # 'null'
-	FALSE = 'false'  # 'false'
-	TRUE = 'true'  # 'true'
-	
-	# Other types of tokens
-	LBRACE = 'LBRACE'  # '{'
-	RBRACE = 'RBRACE'  # '}'
-	LBRACKET = 'LBRACKET'  # '['
-	RBRACKET = 'RBRACKET'  # ']'
-	COMMA = 'COMMA'  # ','
-	COLON = 'COLON'  # ':'
-	SEMICOLON = 'SEMICOLON'  # ';'
-
-
-# Defining tokens
-class Token:
-	
-	def __init__(self, type_, value=None):
-		self.type = type_
-		self.value = value
-	
-	def __repr__(self):
-		# Recognize string, number, booleans and all other characters relevant in JSON
-		if self.type == TokenType.STRING:
-			return f"<STR, {self.value}>"
-		elif self.type == TokenType.NUMBER:
-			return f"<NUM, {self.value}>"
-		elif self.type == TokenType.NULL:
-			return "<NULL>"
-		elif self.type == TokenType.LBRACE:
-			return "<{>"
-		elif self.type == TokenType.RBRACE:
-			return "<}>"
-		elif self.type == TokenType.LBRACKET:
-			return "<[>"
-		elif self.type == TokenType.RBRACKET:
-			return "<]>"
-		elif self.type == TokenType.COMMA:
-			return "<,>"
-		elif self.type == TokenType.COLON:
-			return "<:>"
-		elif self.type == TokenType.SEMICOLON:
-			return "<;>"
-		else:
-			return f"<{self.type}>"
-
-
-# Lexer error
-class LexerError:
-	def __init__(self, position, character, exception_type=""):
-		self.character = character
-		self.position = position
-		if exception_type == "C":
-			self.print_character_related_error()
-		elif exception_type == "E":
-			self.print_string_related_error()
-		elif exception_type == "B":
-			self.print_boolean_related_error()
-	
-	def print_character_related_error(self):
-		print(f"Invalid character '{self.character}' at position {self.position}")
-		
-	def print_string_related_error(self):
-		print(f"Invalid string at position {self.position}, character {self.character}")
+import codecs
+import mmap
+import re
+import struct
+import sys
+
+# NumPy is optional, only IndexedDFA uses it and falls back to the FastDFA without it
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+from diagnostics import Diagnostics
+from tokens import TokenType, Token, PackedTokens, TOKEN_LENGTHS, BINARY_MAGIC, BINARY_VERSION, LONG_LENGTH, TYPE_CODES
+
+# Default number of characters read at a time by StreamDFA
+CHUNK_SIZE = 64 * 1024
+# Default limits of a SymbolTable: number of different strings kept and length of the longest one
+MAX_SYMBOLS = 64 * 1024
+SYMBOL_LENGTH = 256
+
+
+# Symbol table of the string values: every STRING token gets the same str object for the same value, so repeated
+# keys share one string, and the number of times every value was seen is counted. Values get ids in the order they
+# are first seen. Strings longer than max_length, and new values once max_symbols are kept, are passed through as
+# they are and not counted, so the table stays small for documents with many different values.
+class SymbolTable:
+	def __init__(self, max_symbols=MAX_SYMBOLS, max_length=SYMBOL_LENGTH):
+		self.max_symbols = max_symbols
+		self.max_length = max_length
+		# Id of every value, and the values and their counts by id
+		self.ids = {}
+		self.values = []
+		self.counts = []
+	
+	def __len__(self):
+		return len(self.values)
+	
+	def __contains__(self, value):
+		return value in self.ids
+	
+	# The stored string equal to value (value itself the first time), counting the occurrence
+	def intern(self, value):
+		symbol = self.ids.get(value)
+		if symbol is not None:
+			self.counts[symbol] += 1
+			return self.values[symbol]
+		if len(self.values) < self.max_symbols and len(value) <= self.max_length:
+			self.ids[value] = len(self.values)
+			self.values.append(value)
+			self.counts.append(1)
+		return value
+	
+	# Id of value, None if it is not in the table
+	def symbol_id(self, value):
+		return self.ids.get(value)
 	
-	def print_boolean_related_error(self):
-		print(f"Invalid boolean (true/false/null) at position {self.position}, character: {self.character}")
+	def count(self, value):
+		symbol = self.ids.get(value)
+		return self.counts[symbol] if symbol is not None else 0
+	
+	# (value, count) of the n most frequent values (all if n is None), most frequent first
+	def most_common(self, n=None):
+		pairs = sorted(zip(self.values, self.counts), key=lambda pair: pair[1], reverse=True)
+		return pairs if n is None else pairs[:n]
 
 
 class DFA:
-	def __init__(self, input_text):
+	# Lexer errors are recorded in diagnostics, a Diagnostics shared with the parser or a new one
+	# String values are interned in symbols, a SymbolTable that can be shared between lexers, None to not intern them
+	def __init__(self, input_text, diagnostics=None, symbols=None):
 		# Input string
 		self.input_text = input_text
+		self.diagnostics = diagnostics if diagnostics is not None else Diagnostics()
 		# Current position
 		self.position = 0
 		self.current_char = self.input_text[self.position] if self.input_text else None
-		# Symbol table
-		self.symbol_table = {}
+		# Symbol table, None if string values are not interned
+		self.symbol_table = symbols
 		
 	# Tokenize the input
 	def tokenize(self):
@@ -90,8 +86,21 @@ class DFA:
 				if token is not None and token.type == TokenType.EOF:
 					break
 				tokens.append(token)
+			self.diagnostics.flush()
 			return tokens
 	
+	# Lazy version of tokenize, used to feed the parser directly without a token file.
+	# Failed recognitions (None or "") are dropped, same as when reading the token file back.
+	def iter_tokens(self):
+		while True:
+			token = self.get_next_token()
+			if not token:
+				continue
+			if token.type == TokenType.EOF:
+				self.diagnostics.flush()
+				return
+			yield token
+	
 	# Get next token from input
 	def get_next_token(self):
 		while self.current_char is not None:
@@ -135,7 +144,7 @@ class DFA:
 			if self.current_char.isdigit() or self.current_char in ['-', '+']:
 				return self.recognize_number()
 			# Unrecognized characters
-			LexerError(self.position, self.current_char, "C")
+			self.diagnostics.lexer_error("C", self.position, self.current_char)
 			self.advance()
 		# Eof
 		return Token(TokenType.EOF)
@@ -164,10 +173,10 @@ class DFA:
 		if self.current_char == '"':
 			self.advance()
 		else:
-			LexerError(self.position, self.current_char, "S")
+			self.diagnostics.lexer_error("S", self.position, self.current_char)
 			return ""
 		
-		return Token(TokenType.STRING, result)
+		return Token(TokenType.STRING, result if self.symbol_table is None else self.symbol_table.intern(result))
 	
 	# Recognize numbers
 	def recognize_number(self):
@@ -192,25 +201,548 @@ class DFA:
 		elif result == 'null':
 			return Token(TokenType.NULL)
 		else:
-			LexerError(position, self.current_char, "B")
+			self.diagnostics.lexer_error("B", position, self.current_char)
+			
+
+# Read the next piece of text from a text or binary stream, empty string at end of input
+def read_text(stream, size, decoder):
+	while True:
+		data = stream.read(size)
+		if isinstance(data, str):
+			return data
+		final = not data
+		text = decoder.decode(data, final)
+		if text or final:
+			return text
+
+
+# Streaming version of the DFA, reads the input from a file object (text or binary) or an mmap
+# in chunks of chunk_size instead of taking the whole document as one string.
+# Only the current chunk is kept in memory, tokens that cross a chunk boundary are handled by advance()
+# moving on to the next chunk. Positions are still counted in characters from the start of the input.
+class StreamDFA(DFA):
+	def __init__(self, stream, chunk_size=CHUNK_SIZE, diagnostics=None, symbols=None):
+		self.stream = stream
+		self.diagnostics = diagnostics if diagnostics is not None else Diagnostics()
+		self.chunk_size = chunk_size
+		# Bytes input (binary files and mmap) is decoded as utf-8, the decoder keeps characters split between chunks
+		self.decoder = codecs.getincrementaldecoder("utf-8")()
+		self.chunk = ""
+		# Position in the input of the first character of the current chunk
+		self.chunk_start = 0
+		self.input_text = None
+		self.position = 0
+		self.symbol_table = symbols
+		self.read_chunk()
+		self.current_char = self.chunk[0] if self.chunk else None
+	
+	# Replace the current chunk with the next one, empty string at end of input
+	def read_chunk(self):
+		self.chunk_start += len(self.chunk)
+		self.chunk = read_text(self.stream, self.chunk_size, self.decoder)
+	
+	# Input Buffering
+	def advance(self):
+		self.position += 1
+		offset = self.position - self.chunk_start
+		if offset >= len(self.chunk):
+			self.read_chunk()
+			offset = 0
+			if not self.chunk:
+				# End of input
+				self.current_char = None
+				return
+		self.current_char = self.chunk[offset]
+
+
+# Single character tokens for FastDFA
+PUNCTUATION = {
+	'{': TokenType.LBRACE,
+	'}': TokenType.RBRACE,
+	'[': TokenType.LBRACKET,
+	']': TokenType.RBRACKET,
+	',': TokenType.COMMA,
+	':': TokenType.COLON,
+	';': TokenType.SEMICOLON,
+}
+# Runs of characters scanned in one go by FastDFA. The DFA tests characters with isspace(), isalpha() and isdigit(),
+# \s matches exactly the isspace() characters, the other two patterns only cover ASCII and
+# non ASCII letters/digits are checked one at a time in FastDFA.scan_run
+WHITESPACE_RUN = re.compile(r'\s*')
+ALPHA_RUN = re.compile(r'[A-Za-z]*')
+NUMBER_RUN = re.compile(r'[0-9.eE+\-]*')
+
+
+# Faster lexer engine giving exactly the same tokens and LexerErrors as the DFA.
+# Instead of moving one character at a time with advance(), it finds the end of each token with str.find or
+# a compiled regex and slices the token value out of the input.
+# Takes either the whole input as a string or a stream (like StreamDFA), in which case the
+# input is kept in a buffer that is refilled when a token runs into the end of it.
+class FastDFA(DFA):
+	def __init__(self, input_text="", stream=None, chunk_size=CHUNK_SIZE, diagnostics=None, symbols=None):
+		self.input_text = input_text
+		self.diagnostics = diagnostics if diagnostics is not None else Diagnostics()
+		self.stream = stream
+		self.chunk_size = chunk_size
+		self.decoder = codecs.getincrementaldecoder("utf-8")()
+		# Position in the input of input_text[0] and index of the next character to scan in input_text
+		self.offset = 0
+		self.index = 0
+		self.position = 0
+		self.current_char = None
+		self.symbol_table = symbols
+	
+	# Drop the input before start and append more text from the stream. Returns False at end of input.
+	# The token starting at start is then scanned again from the beginning of the buffer.
+	def read_more(self, start):
+		if self.stream is None:
+			return False
+		rest = self.input_text[start:]
+		# Read at least as much as is left over so that very long tokens don't get rescanned too often
+		text = read_text(self.stream, max(self.chunk_size, len(rest)), self.decoder)
+		if not text:
+			self.stream = None
+			return False
+		self.input_text = rest + text
+		self.offset += start
+		self.index = 0
+		return True
+	
+	# Move to index i of the buffer
+	def move(self, i):
+		self.index = i
+		self.position = self.offset + i
+	
+	# End of a run of characters matched by pattern, or for which test is true, starting at i
+	def scan_run(self, pattern, test, i):
+		text = self.input_text
+		end = pattern.match(text, i).end()
+		while end < len(text) and not text[end].isascii() and test(text[end]):
+			end = pattern.match(text, end + 1).end()
+		return end
+	
+	# Get next token from input
+	def get_next_token(self):
+		while True:
+			text = self.input_text
+			length = len(text)
+			i = self.index
+			if i >= length:
+				if self.read_more(i):
+					continue
+				self.move(i)
+				return Token(TokenType.EOF)
+			char = text[i]
+			
+			type_ = PUNCTUATION.get(char)
+			if type_ is not None:
+				self.move(i + 1)
+				return Token(type_)
+			
+			if char.isspace():
+				self.move(WHITESPACE_RUN.match(text, i).end())
+				continue
+			
+			# Strings
+			if char == '"':
+				end = text.find('"', i + 1)
+				if end < 0:
+					if self.read_more(i):
+						continue
+					self.move(length)
+					self.diagnostics.lexer_error("S", self.position, None)
+					return ""
+				self.move(end + 1)
+				value = text[i + 1:end]
+				return Token(TokenType.STRING, value if self.symbol_table is None else self.symbol_table.intern(value))
+			
+			# Booleans and null
+			if char in "tfn":
+				end = self.scan_run(ALPHA_RUN, str.isalpha, i)
+				if end >= length and self.read_more(i):
+					continue
+				self.move(end)
+				result = text[i:end]
+				if result == "true":
+					return Token(TokenType.TRUE)
+				elif result == "false":
+					return Token(TokenType.FALSE)
+				elif result == "null":
+					return Token(TokenType.NULL)
+				self.diagnostics.lexer_error("B", self.offset + i, text[end] if end < length else None)
+				return None
+			
+			# Numbers
+			if char.isdigit() or char in "-+":
+				end = self.scan_run(NUMBER_RUN, str.isdigit, i)
+				if end >= length and self.read_more(i):
+					continue
+				self.move(end)
+				return Token(TokenType.NUMBER, text[i:end])
 			
+			# Unrecognized characters
+			self.diagnostics.lexer_error("C", self.offset + i, char)
+			self.move(i + 1)
+
+
+
+# Number of characters of the buffer indexed at a time by IndexedDFA
+INDEX_WINDOW = 1024 * 1024
+# Character classes of the structural index
+CLASS_WHITESPACE = 0
+CLASS_PUNCTUATION = 1
+CLASS_QUOTE = 2
+CLASS_OTHER = 3
+WORD_TOKENS = {"true": TokenType.TRUE, "false": TokenType.FALSE, "null": TokenType.NULL}
+
+
+# Class of every ASCII character (the same tests as the DFA), whether it can be part of a number and
+# whether it can start one
+def ascii_tables():
+	classes = numpy.full(128, CLASS_OTHER, dtype=numpy.uint8)
+	number = numpy.zeros(128, dtype=bool)
+	number_start = numpy.zeros(128, dtype=bool)
+	for code in range(128):
+		char = chr(code)
+		if char.isspace():
+			classes[code] = CLASS_WHITESPACE
+		elif char in PUNCTUATION:
+			classes[code] = CLASS_PUNCTUATION
+		elif char == '"':
+			classes[code] = CLASS_QUOTE
+		number[code] = char.isdigit() or char in ".eE+-"
+		number_start[code] = char.isdigit() or char in "+-"
+	return classes, number, number_start
+
+
+if numpy is not None:
+	ASCII_CLASSES, NUMBER_CHARACTERS, NUMBER_STARTS = ascii_tables()
+	# Token type of every index entry by its character code, None for the start of a run of other characters
+	ENTRY_TYPES = numpy.array([PUNCTUATION.get(chr(code)) for code in range(128)], dtype=object)
+	ENTRY_TYPES[ord('"')] = TokenType.STRING
+
+
+# Stage 1 structural index of text[start:end], which must start between two tokens.
+# The characters are classified in vectorized passes over a numpy array of the character codes (uint8 for ASCII
+# text, uint32 otherwise so that positions stay character positions): strings are found from the quote positions
+# (every quote outside a string opens one and the next quote closes it, the lexer has no escapes), and outside strings
+# every punctuation character, opening quote and start of a run of other characters is an entry.
+# Returns three lists: position of every entry, its token type and where it ends. Strings end at the closing quote
+# (-1 if it is not in the window). Runs that are one number (only number characters, starting with a digit, + or -)
+# have the type NUMBER, other runs (true/false/null, unknown characters, several tokens) have None.
+def structural_index(text, start, end):
+	window = text[start:end]
+	if window.isascii():
+		codes = numpy.frombuffer(window.encode("ascii"), dtype=numpy.uint8)
+		ascii_codes = codes
+		classes = ASCII_CLASSES[codes]
+	else:
+		codes = numpy.frombuffer(window.encode("utf-32-le"), dtype=numpy.uint32)
+		wide = codes > 127
+		# Other characters are not part of numbers and are classified once per distinct character
+		ascii_codes = numpy.where(wide, ord("a"), codes)
+		classes = ASCII_CLASSES[ascii_codes]
+		distinct, inverse = numpy.unique(codes[wide], return_inverse=True)
+		table = numpy.array([CLASS_WHITESPACE if chr(code).isspace() else CLASS_OTHER for code in distinct.tolist()], dtype=numpy.uint8)
+		classes[wide] = table[inverse]
+	quotes = classes == CLASS_QUOTE
+	# True from an opening quote up to its closing quote (excluded)
+	in_string = (numpy.cumsum(quotes, dtype=numpy.int64) & 1).astype(bool)
+	outside = ~in_string & ~quotes
+	other = outside & (classes == CLASS_OTHER)
+	previous_other = numpy.zeros_like(other)
+	previous_other[1:] = other[:-1]
+	next_other = numpy.zeros_like(other)
+	next_other[:-1] = other[1:]
+	run_starts = other & ~previous_other
+	run_ends = numpy.flatnonzero(other & ~next_other) + 1
+	opening = quotes & in_string
+	quote_positions = numpy.flatnonzero(quotes)
+
+	positions = numpy.flatnonzero((outside & (classes == CLASS_PUNCTUATION)) | opening | run_starts)
+	types = ENTRY_TYPES[ascii_codes[positions]]
+	ends = positions + (start + 1)
+	# Closing quote: the quote after the opening one
+	is_string = opening[positions]
+	closing = numpy.searchsorted(quote_positions, positions[is_string]) + 1
+	found = closing < len(quote_positions)
+	ends[is_string] = numpy.where(found, quote_positions[numpy.minimum(closing, len(quote_positions) - 1)] + start, -1)
+	is_run = run_starts[positions]
+	run_positions = positions[is_run]
+	ends_of_runs = run_ends[numpy.searchsorted(run_ends, run_positions, side="right")]
+	ends[is_run] = ends_of_runs + start
+	# Runs without a character that can't be in a number: count those characters up to every position
+	not_number = numpy.concatenate(([0], numpy.cumsum(~NUMBER_CHARACTERS[ascii_codes], dtype=numpy.int64)))
+	is_number = (not_number[ends_of_runs] == not_number[run_positions]) & NUMBER_STARTS[ascii_codes[run_positions]]
+	types[is_run] = numpy.where(is_number, TokenType.NUMBER, None)
+	return (positions + start).tolist(), types.tolist(), ends.tolist()
+
+
+# FastDFA that jumps between the entries of a structural index (see structural_index) instead of looking at every
+# character: whitespace is never scanned, punctuation, strings and numbers come straight from the index and
+# true/false/null are looked up. Everything else (unknown characters, invalid booleans, runs that are several
+# tokens, strings and runs that go past the indexed window) is left to FastDFA.get_next_token, so the tokens
+# and lexer errors are exactly those of the DFA. Without numpy it is just the FastDFA.
+class IndexedDFA(FastDFA):
+	def __init__(self, input_text="", stream=None, chunk_size=CHUNK_SIZE, diagnostics=None, window=INDEX_WINDOW, symbols=None):
+		FastDFA.__init__(self, input_text, stream, chunk_size, diagnostics, symbols)
+		self.window = window
+		# Index of input_text[window_start:window_end], number of entries and the next entry to use
+		self.positions = None
+		self.types = None
+		self.ends = None
+		self.count = 0
+		self.entry = 0
+		self.window_start = 0
+		self.window_end = 0
+		# True while the last token came from the index, the next entry is then the next token
+		self.synced = False
+
+	# The buffer is replaced, the index is built again for the new one
+	def read_more(self, start):
+		if not FastDFA.read_more(self, start):
+			return False
+		self.positions = None
+		self.synced = False
+		return True
+
+	def build_index(self, start):
+		self.window_start = start
+		self.window_end = min(len(self.input_text), start + self.window)
+		self.positions, self.types, self.ends = structural_index(self.input_text, start, self.window_end)
+		self.count = len(self.positions)
+		self.entry = 0
+
+	# Index the rest of the buffer from i on if a token at i runs into the end of the window, returns False if
+	# it is the first token of the window or the window already reaches the end of the buffer
+	def next_window(self, i):
+		if i == self.window_start or self.window_end >= len(self.input_text):
+			return False
+		self.positions = None
+		self.move(i)
+		return True
+
+	# Let FastDFA scan the token starting at index i
+	def scan_from(self, i):
+		self.synced = False
+		self.move(i)
+		return FastDFA.get_next_token(self)
+
+	def get_next_token(self):
+		entry = self.entry
+		if self.synced and entry < self.count:
+			type_ = self.types[entry]
+			end = self.ends[entry]
+			if type_ is not None and end < self.window_end and end >= 0:
+				self.entry = entry + 1
+				if type_ == TokenType.STRING:
+					self.index = end + 1
+					self.position = self.offset + end + 1
+					value = self.input_text[self.positions[entry] + 1:end]
+					return Token(type_, value if self.symbol_table is None else self.symbol_table.intern(value))
+				self.index = end
+				self.position = self.offset + end
+				if type_ == TokenType.NUMBER:
+					return Token(type_, self.input_text[self.positions[entry]:end])
+				return Token(type_)
+		return self.index_token()
+
+	# get_next_token when the next token is not simply the next entry
+	def index_token(self):
+		if numpy is None:
+			return FastDFA.get_next_token(self)
+		while True:
+			if self.positions is None:
+				self.build_index(self.index)
+			positions = self.positions
+			entry = self.entry
+			count = self.count
+			index = self.index
+			# Skip the entries FastDFA already went past
+			while entry < count and positions[entry] < index:
+				entry += 1
+			self.entry = entry
+			i = positions[entry] if entry < count else self.window_end
+			if index < i and index < len(self.input_text) and not self.input_text[index].isspace():
+				# FastDFA stopped inside a run of other characters
+				return self.scan_from(index)
+			if entry == count:
+				# Only whitespace is left in the window
+				if self.next_window(max(index, self.window_end)):
+					continue
+				return self.scan_from(index)
+			type_ = self.types[entry]
+			end = self.ends[entry]
+			if end >= self.window_end or end < 0:
+				# The string or run can go on after the window
+				if self.next_window(i):
+					continue
+				return self.scan_from(i)
+			if type_ is None:
+				type_ = WORD_TOKENS.get(self.input_text[i:end])
+				if type_ is None:
+					return self.scan_from(i)
+			self.entry = entry + 1
+			self.synced = True
+			if type_ == TokenType.STRING:
+				self.move(end + 1)
+				value = self.input_text[i + 1:end]
+				return Token(type_, value if self.symbol_table is None else self.symbol_table.intern(value))
+			self.move(end)
+			if type_ == TokenType.NUMBER:
+				return Token(type_, self.input_text[i:end])
+			return Token(type_)
+
+# Create the lexer for the input text, fast selects FastDFA instead of the DFA and indexed the IndexedDFA.
+# String values are interned in symbols (a SymbolTable), None does not intern them.
+def make_lexer(input_text, fast=False, diagnostics=None, indexed=False, symbols=None):
+	if indexed:
+		return IndexedDFA(input_text, diagnostics=diagnostics, symbols=symbols)
+	if fast:
+		return FastDFA(input_text, diagnostics=diagnostics, symbols=symbols)
+	return DFA(input_text, diagnostics, symbols)
+
+
+# Run the DFA and FastDFA (or another lexer_class taking the same arguments) on the same input and compare the
+# tokens and the lexer errors. Returns None if they match, otherwise (token index, DFA token, FastDFA token) of the
+# first difference, where a missing token is None and index -1 means only the lexer errors differ.
+def compare_lexers(input_text, lexer_class=None):
+	results = []
+	lexer_class = lexer_class if lexer_class is not None else FastDFA
+	for lexer in (DFA(input_text, Diagnostics(quiet=True)), lexer_class(input_text, diagnostics=Diagnostics(quiet=True))):
+		tokens = [repr(token) for token in lexer.iter_tokens()]
+		# Compare the full entries, also the ones that are not printed
+		errors = [(entry.code, entry.position, entry.detail) for entry in lexer.diagnostics.entries]
+		results.append((tokens, errors))
+	(dfa_tokens, dfa_errors), (fast_tokens, fast_errors) = results
+	for i in range(max(len(dfa_tokens), len(fast_tokens))):
+		dfa_token = dfa_tokens[i] if i < len(dfa_tokens) else None
+		fast_token = fast_tokens[i] if i < len(fast_tokens) else None
+		if dfa_token != fast_token:
+			return i, dfa_token, fast_token
+	if dfa_errors != fast_errors:
+		return -1, dfa_errors, fast_errors
+	return None
+
+
+# Lexer reading from a stream, fast selects FastDFA instead of StreamDFA and indexed the IndexedDFA
+def stream_lexer(stream, chunk_size=CHUNK_SIZE, fast=False, diagnostics=None, indexed=False, symbols=None):
+	if indexed:
+		return IndexedDFA(stream=stream, chunk_size=chunk_size, diagnostics=diagnostics, symbols=symbols)
+	if fast:
+		return FastDFA(stream=stream, chunk_size=chunk_size, diagnostics=diagnostics, symbols=symbols)
+	return StreamDFA(stream, chunk_size, diagnostics, symbols)
+
+
+# Generator of the tokens in a file, read in chunks. With use_mmap the file is memory mapped instead of read.
+# fast selects FastDFA instead of StreamDFA and indexed the IndexedDFA, lexer errors go to diagnostics (see DFA).
+# profile is an optional profiling.Profile that the lexer is attached to, string values are interned in symbols (if not None).
+def tokenize_file(file_name, chunk_size=CHUNK_SIZE, use_mmap=False, fast=False, diagnostics=None, profile=None, indexed=False, symbols=None):
+	if use_mmap:
+		with open(file_name, "rb") as file:
+			# mmap can not map empty files
+			if file.seek(0, 2) == 0:
+				return
+			with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+				yield from profiled_lexer(stream_lexer(mapped, chunk_size, fast, diagnostics, indexed, symbols), profile).iter_tokens()
+	else:
+		with open(file_name, "r") as file:
+			yield from profiled_lexer(stream_lexer(file, chunk_size, fast, diagnostics, indexed, symbols), profile).iter_tokens()
+
+
+# Bytes that are not ASCII, a memory mapped file with none of them can back PackedTokens directly
+NON_ASCII = re.compile(rb'[\x80-\xff]')
+
+
+# Run the lexer and keep its tokens as offsets into buffer, the input the lexer reads (see tokens.PackedTokens).
+# Token values are dropped as soon as they are scanned, only the arrays of the PackedTokens stay.
+def pack_tokens(lexer, buffer):
+	packed = PackedTokens(buffer)
+	for token in lexer.iter_tokens():
+		end = lexer.position
+		type_ = token.type
+		if type_ == TokenType.STRING:
+			packed.append(type_, end - 1 - len(token.value), end - 1)
+		elif type_ == TokenType.NUMBER:
+			packed.append(type_, end - len(token.value), end)
+		else:
+			packed.append(type_, end - TOKEN_LENGTHS[type_], end)
+	return packed
+
+
+# PackedTokens of input text (see make_lexer for the other arguments)
+def pack_text(input_text, fast=False, diagnostics=None, indexed=False, symbols=None):
+	return pack_tokens(make_lexer(input_text, fast, diagnostics, indexed, symbols), input_text)
+
+
+# PackedTokens of a file. With use_mmap an ASCII file stays memory mapped and the tokens point into the mapping
+# (close it with packed.buffer.close() when done), otherwise the file is read into one string.
+def pack_file(file_name, chunk_size=CHUNK_SIZE, use_mmap=False, fast=False, diagnostics=None, indexed=False, symbols=None):
+	if use_mmap:
+		with open(file_name, "rb") as file:
+			# mmap can not map empty files
+			if file.seek(0, 2) == 0:
+				return PackedTokens("")
+			mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+		if NON_ASCII.search(mapped) is None:
+			return pack_tokens(stream_lexer(mapped, chunk_size, fast, diagnostics, indexed, symbols), mapped)
+		mapped.close()
+	with open(file_name, "r") as file:
+		text = file.read()
+	return pack_text(text, fast, diagnostics, indexed, symbols)
+
+
+# Attach the lexer to profile (a profiling.Profile) if there is one
+def profiled_lexer(lexer, profile=None):
+	if profile is not None:
+		profile.attach_lexer(lexer)
+	return lexer
+
+
+# Write tokens to a binary token file (format described in tokens.py), returns the number of tokens written
+def write_binary_tokens(tokens, file_name):
+	count = 0
+	with open(file_name, "wb") as file:
+		file.write(BINARY_MAGIC + bytes([BINARY_VERSION]))
+		for token in tokens:
+			code = TYPE_CODES[token.type]
+			if token.type == TokenType.STRING or token.type == TokenType.NUMBER:
+				value = token.value.encode("utf-8")
+				if len(value) < LONG_LENGTH:
+					file.write(bytes([code, len(value)]))
+				else:
+					file.write(bytes([code, LONG_LENGTH]) + struct.pack("<Q", len(value)))
+				file.write(value)
+			else:
+				file.write(bytes([code]))
+			count += 1
+	return count
+
 
 # Testing the Lexer with input
+# python scanner.py [--fast] [--indexed] [--binary]
+# --indexed uses the IndexedDFA (needs numpy, otherwise it is the FastDFA)
+# --binary writes the tokens to test_input_parser_X.tok in the binary format instead
 if __name__ == "__main__":
+	fast = "--fast" in sys.argv[1:]
+	indexed = "--indexed" in sys.argv[1:]
+	binary = "--binary" in sys.argv[1:]
 	for i in range(1, 4):
 		file_name = "test_input_" + str(i) + ".txt"
 		print("Testing file " + file_name)
-		file = open(file_name, "r")
-		input_string = ""
-		for line in file:
-			input_string += line
-		lexer = DFA(input_string)
-		Output_file = open("test_input_parser_" + str(i) + ".txt", "w")
-		tokens = lexer.tokenize()
-		for token in tokens:
-			if token is not None:
+		# The whole file is scanned first, so the lexer errors come before the tokens
+		diagnostics = Diagnostics()
+		if binary:
+			count = write_binary_tokens(tokenize_file(file_name, fast=fast, diagnostics=diagnostics, indexed=indexed), "test_input_parser_" + str(i) + ".tok")
+			diagnostics.flush()
+			print(str(count) + " tokens written")
+		else:
+			tokens = list(tokenize_file(file_name, fast=fast, diagnostics=diagnostics, indexed=indexed))
+			diagnostics.flush()
+			Output_file = open("test_input_parser_" + str(i) + ".txt", "w")
+			for token in tokens:
 				print(token, file=Output_file)
 				print(token)
+			Output_file.close()
 		print("------End of file: " + file_name + "------")
 		print()
-		Output_file.close()
@@ -0,0 +1,394 @@
+# Parse server: a long running process that answers scan, parse and validate requests over a Unix socket or a local
+# TCP port, so that every small document doesn't pay for starting Python and importing the scanner and parser.
+# python server.py [--socket PATH | --host HOST --port N] [--workers N] [--batch-size N] [--batch-wait MS]
+# Requests and responses are JSON objects, one per line (client.py has a client):
+#   {"id": 1, "op": "parse", "text": "...", "fast": false, "compact": false, "max_depth": null, "max_errors": null}
+#   scan:     {"id": 1, "ok": true, "tokens": ["<{>", ...], "messages": [...], "error_text": "...", "counts": {...}}
+#   parse:    the same with "ast", the AST output text, instead of "tokens"
+#   validate: only the messages, the error file text and the number of lexer, parser and semantic errors
+#   stats:    queue depth, request and batch counts and latency percentiles (milliseconds)
+# A request that fails (max_depth exceeded, ...) gets "ok": false and "error". The responses of a connection come back
+# in the order the requests finish.
+# The requests are run in a pool of worker processes that have parsed a small document once before the server starts
+# to listen. Small requests that arrive together are sent to a worker as one batch (up to batch_size of them, waiting
+# at most batch_wait for more), large ones alone. At most two batches per worker are handed to the pool at a time, the
+# other requests wait in the queue and go out in fuller batches.
+import argparse
+import io
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from client import DEFAULT_HOST, DEFAULT_PORT
+from diagnostics import Diagnostics, LEXER, PARSER, SEMANTIC
+from parser import parse_tokens, write_tree
+from scanner import make_lexer
+
+# Requests per batch and how long the dispatcher waits for more requests to fill one (seconds)
+BATCH_SIZE = 64
+BATCH_WAIT = 0.002
+# Requests with more characters are sent to a worker alone
+SMALL_REQUEST = 64 * 1024
+# Batches handed to the pool per worker
+BATCHES_PER_WORKER = 2
+# Latencies kept for the percentiles
+LATENCY_SAMPLES = 10000
+OPERATIONS = ("scan", "parse", "validate")
+WARM_UP_TEXT = '{"a": [1, 2.5, "b"], "c": {"d": [true, false, null]}}'
+
+
+# Answer one scan, parse or validate request, runs in the workers
+def run_request(request):
+	op = request.get("op")
+	diagnostics = Diagnostics(quiet=True, max_errors=request.get("max_errors"))
+	response = {"id": request.get("id"), "ok": True}
+	try:
+		if op not in OPERATIONS:
+			raise Exception(f"Unknown operation: {op}")
+		lexer = make_lexer(request.get("text", ""), request.get("fast", False), diagnostics, request.get("indexed", False))
+		if op == "scan":
+			response["tokens"] = [repr(token) for token in lexer.iter_tokens()]
+		else:
+			root = parse_tokens(lexer.iter_tokens(), compact=request.get("compact", False), max_depth=request.get("max_depth"), diagnostics=diagnostics)
+			if op == "parse":
+				output = io.StringIO()
+				write_tree(root, output)
+				response["ast"] = output.getvalue()
+	except Exception as error:
+		response["ok"] = False
+		response["error"] = str(error)
+	response["messages"] = diagnostics.text().splitlines()
+	response["error_text"] = diagnostics.error_text()
+	response["counts"] = {source: diagnostics.count(source) for source in (LEXER, PARSER, SEMANTIC)}
+	return response
+
+
+def run_batch(requests):
+	return [run_request(request) for request in requests]
+
+
+# Run every operation once in a new worker, so that the first requests don't wait for the code to warm up
+def warm_up():
+	for op in OPERATIONS:
+		run_request({"op": op, "text": WARM_UP_TEXT})
+
+
+# Value at percent of the sorted values (nearest rank), None if there are none
+def percentile(values, percent):
+	if not values:
+		return None
+	return values[min(len(values) - 1, max(0, (len(values) * percent + 99) // 100 - 1))]
+
+
+# Why the fields of a request can't be used, None if they can
+def request_error(request):
+	if not isinstance(request.get("text", ""), str):
+		return "text has to be a string"
+	for name in ("max_depth", "max_errors"):
+		value = request.get(name)
+		if value is not None and (not isinstance(value, int) or isinstance(value, bool)):
+			return f"{name} has to be an integer or null"
+	return None
+
+
+# One request waiting for its response
+class PendingRequest:
+	__slots__ = ("request", "reply", "received")
+
+	def __init__(self, request, reply):
+		self.request = request
+		# Called with the response
+		self.reply = reply
+		self.received = time.perf_counter()
+
+
+# Reads the requests of one connection and writes their responses
+class RequestHandler(socketserver.StreamRequestHandler):
+	def handle(self):
+		server = self.server.parse_server
+		lock = threading.Lock()
+		# Responses that have not been written yet, the connection is only closed once they are
+		outstanding = threading.Condition(lock)
+		pending = [0]
+
+		def reply(response):
+			data = (json.dumps(response) + "\n").encode("utf-8")
+			with lock:
+				try:
+					self.wfile.write(data)
+				except OSError:
+					# The client went away
+					pass
+				pending[0] -= 1
+				outstanding.notify_all()
+
+		for line in self.rfile:
+			if not line.strip():
+				continue
+			with lock:
+				pending[0] += 1
+			try:
+				request = json.loads(line)
+				if not isinstance(request, dict):
+					raise ValueError("not an object")
+			except ValueError as error:
+				reply({"id": None, "ok": False, "error": f"Invalid request: {error}"})
+				continue
+			error = request_error(request)
+			if error is not None:
+				reply({"id": request.get("id"), "ok": False, "error": f"Invalid request: {error}"})
+				continue
+			if request.get("op") == "stats":
+				reply({"id": request.get("id"), "ok": True, **server.stats()})
+			else:
+				server.submit(request, reply)
+		with lock:
+			while pending[0] > 0:
+				outstanding.wait()
+
+
+class ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+	daemon_threads = True
+
+
+class ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+	daemon_threads = True
+	allow_reuse_address = True
+
+
+class ParseServer:
+	# address is a path for a Unix socket or (host, port). workers is the number of worker processes (the number of
+	# CPUs if None), 0 runs the requests in the server process.
+	def __init__(self, address=(DEFAULT_HOST, DEFAULT_PORT), workers=None, batch_size=BATCH_SIZE, batch_wait=BATCH_WAIT):
+		self.workers = (os.cpu_count() or 1) if workers is None else workers
+		self.batch_size = batch_size
+		self.batch_wait = batch_wait
+		self.queue = queue.Queue()
+		self.pool = None
+		# Limits the batches handed to the pool
+		self.slots = threading.BoundedSemaphore(max(1, self.workers * BATCHES_PER_WORKER))
+		self.lock = threading.Lock()
+		self.requests = 0
+		self.batches = 0
+		self.failures = 0
+		# Requests handed to the pool and not answered yet
+		self.in_flight = 0
+		# Seconds from receiving a request to its response, the last LATENCY_SAMPLES
+		self.latencies = deque(maxlen=LATENCY_SAMPLES)
+		self.started = time.time()
+		if isinstance(address, str):
+			remove_stale_socket(address)
+			self.server = ThreadingUnixServer(address, RequestHandler, bind_and_activate=False)
+		else:
+			self.server = ThreadingTCPServer(address, RequestHandler, bind_and_activate=False)
+		self.server.parse_server = self
+		self.address = address
+		self.dispatcher = None
+
+	# Start the workers and the dispatcher, then bind and listen
+	def start(self):
+		if self.workers > 0:
+			self.pool = self.new_pool()
+		self.dispatcher = threading.Thread(target=self.dispatch, name="dispatcher", daemon=True)
+		self.dispatcher.start()
+		self.server.server_bind()
+		self.server.server_activate()
+		# The real port when port 0 was asked for
+		self.address = self.server.server_address
+
+	def serve_forever(self):
+		if self.dispatcher is None:
+			self.start()
+		try:
+			self.server.serve_forever()
+		finally:
+			self.close()
+
+	# Stop serve_forever (from another thread)
+	def shutdown(self):
+		self.server.shutdown()
+
+	def close(self):
+		self.server.server_close()
+		self.queue.put(None)
+		if self.dispatcher is not None:
+			self.dispatcher.join()
+		if self.pool is not None:
+			self.pool.shutdown()
+		if isinstance(self.address, str) and os.path.exists(self.address):
+			os.remove(self.address)
+
+	# A pool whose workers are all started and warmed up
+	def new_pool(self):
+		pool = ProcessPoolExecutor(self.workers, initializer=warm_up)
+		for future in [pool.submit(time.sleep, 0.05) for _ in range(self.workers)]:
+			future.result()
+		return pool
+
+	# Queue a request, reply is called with its response
+	def submit(self, request, reply):
+		self.queue.put(PendingRequest(request, reply))
+
+	# Take requests from the queue, put them into batches and hand them to the workers
+	def dispatch(self):
+		stopping = False
+		while not stopping:
+			item = self.queue.get()
+			if item is None:
+				return
+			batches = [[item]]
+			try:
+				stopping = self.collect(batches)
+				while batches:
+					self.run(batches[0])
+					batches.pop(0)
+			except Exception as error:
+				# The dispatcher has to go on for the other requests, only these ones fail
+				for batch in batches:
+					self.fail(batch, error)
+
+	# Add the requests that arrive within batch_wait to the batch in batches (large ones go alone into batches of
+	# their own). Returns True if the server is stopping.
+	def collect(self, batches):
+		batch = batches[0]
+		item = batch[0]
+		deadline = time.perf_counter() + self.batch_wait
+		while len(batch) < self.batch_size and len(text_of(item)) < SMALL_REQUEST:
+			timeout = deadline - time.perf_counter()
+			try:
+				item = self.queue.get(timeout=timeout) if timeout > 0 else self.queue.get_nowait()
+			except queue.Empty:
+				break
+			if item is None:
+				return True
+			if len(text_of(item)) >= SMALL_REQUEST:
+				batches.append([item])
+				break
+			batch.append(item)
+		return False
+
+	# Run a batch in the pool, or here if there are no workers
+	def run(self, batch):
+		with self.lock:
+			self.batches += 1
+			self.in_flight += len(batch)
+		requests = [item.request for item in batch]
+		if self.pool is None:
+			self.finish(batch, run_batch(requests), None)
+			return
+		self.slots.acquire()
+		try:
+			future = self.submit_batch(requests)
+		except Exception as error:
+			self.slots.release()
+			self.finish(batch, None, error)
+			return
+
+		def done(future):
+			self.slots.release()
+			error = future.exception()
+			self.finish(batch, None if error is not None else future.result(), error)
+		future.add_done_callback(done)
+
+	# Answer the requests of a batch that was not handed to run with error
+	def fail(self, batch, error):
+		with self.lock:
+			self.batches += 1
+			self.in_flight += len(batch)
+		self.finish(batch, None, error)
+
+	# Hand requests to the pool, with new workers if a worker died (killed, out of memory) or new ones could not be
+	# started the last time
+	def submit_batch(self, requests):
+		try:
+			return self.pool.submit(run_batch, requests)
+		except (BrokenProcessPool, RuntimeError):
+			self.pool.shutdown(wait=False)
+			self.pool = self.new_pool()
+			return self.pool.submit(run_batch, requests)
+
+	def finish(self, batch, responses, error):
+		if responses is None:
+			responses = [{"id": item.request.get("id"), "ok": False, "error": f"Request failed: {error!r}"} for item in batch]
+		now = time.perf_counter()
+		with self.lock:
+			self.in_flight -= len(batch)
+			self.requests += len(batch)
+			self.failures += sum(1 for response in responses if not response["ok"])
+			self.latencies.extend(now - item.received for item in batch)
+		for item, response in zip(batch, responses):
+			item.reply(response)
+
+	def stats(self):
+		with self.lock:
+			latencies = sorted(self.latencies)
+			in_flight = self.in_flight
+			requests = self.requests
+			batches = self.batches
+			failures = self.failures
+		queued = self.queue.qsize()
+		return {
+			"workers": self.workers,
+			"queue_depth": queued + in_flight,
+			"queued": queued,
+			"in_flight": in_flight,
+			"requests": requests,
+			"failures": failures,
+			"batches": batches,
+			"uptime": time.time() - self.started,
+			"latency_ms": {
+				name: None if value is None else value * 1000
+				for name, value in (("p50", percentile(latencies, 50)), ("p90", percentile(latencies, 90)),
+					("p99", percentile(latencies, 99)), ("max", latencies[-1] if latencies else None))
+			},
+		}
+
+
+def text_of(item):
+	text = item.request.get("text")
+	return text if isinstance(text, str) else ""
+
+
+# Remove a socket file left behind by a server that did not shut down, but not that of a running server
+def remove_stale_socket(path):
+	if not os.path.exists(path):
+		return
+	probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	try:
+		probe.connect(path)
+	except OSError:
+		os.remove(path)
+		return
+	finally:
+		probe.close()
+	raise Exception(f"A server is already listening on {path}")
+
+
+def main(argv=None):
+	arguments = argparse.ArgumentParser(description="Serve scan, parse and validate requests from warm worker processes")
+	arguments.add_argument("--socket", help="listen on this Unix socket instead of TCP")
+	arguments.add_argument("--host", default=DEFAULT_HOST)
+	arguments.add_argument("--port", type=int, default=DEFAULT_PORT)
+	arguments.add_argument("--workers", type=int, default=None, help="worker processes (default: number of CPUs, 0: none)")
+	arguments.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+	arguments.add_argument("--batch-wait", type=float, default=BATCH_WAIT * 1000, help="milliseconds to wait for a batch to fill")
+	options = arguments.parse_args(argv)
+	address = options.socket if options.socket else (options.host, options.port)
+	server = ParseServer(address, options.workers, options.batch_size, options.batch_wait / 1000)
+	server.start()
+	print(f"Parse server listening on {server.address} with {server.workers} workers")
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+
+
+if __name__ == "__main__":
+	main()
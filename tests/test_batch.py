@@ -0,0 +1,13 @@
+import os
+
+from batch import find_files
+
+
+def test_find_files_skips_outputs(tmp_path):
+	names = ["a.txt", "a_errors.txt", "a_AST_output.txt", "a_AST_output_profile.json", "test_input_1.txt",
+		"test_input_parser_1.txt", "test_input_parser_1_errors.txt", "test_input_parser_1.tok", "test_AST_output_1.txt"]
+	for name in names:
+		(tmp_path / name).write_text("[1]")
+	expected = ["a.txt", "test_input_1.txt"]
+	assert [os.path.basename(name) for name in find_files(str(tmp_path))] == expected
+	assert [os.path.basename(name) for name in find_files(str(tmp_path / "*"))] == expected
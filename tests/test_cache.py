@@ -0,0 +1,46 @@
+import os
+import pickle
+
+import pytest
+
+from cache import DISK_MAGIC, ParseCache
+from diagnostics import Diagnostics
+
+TEXT = '{"a": [1, 2]}'
+
+
+def parse(cache):
+	return cache.parse_text(TEXT, diagnostics=Diagnostics(quiet=True))
+
+
+def test_disk_round_trip(tmp_path):
+	directory = str(tmp_path / "cache")
+	parse(ParseCache(directory=directory))
+	if os.name == "posix":
+		assert os.stat(directory).st_mode & 0o777 == 0o700
+	cache = ParseCache(directory=directory)
+	parse(cache)
+	assert cache.stats()["disk_hits"] == 1
+
+
+def test_unsigned_file_is_not_unpickled(tmp_path):
+	directory = str(tmp_path / "cache")
+	parse(ParseCache(directory=directory))
+	for name in os.listdir(directory):
+		if name.endswith(".pickle"):
+			with open(os.path.join(directory, name), "wb") as file:
+				file.write(DISK_MAGIC + bytes(32) + pickle.dumps("planted"))
+	cache = ParseCache(directory=directory)
+	result = parse(cache)
+	assert cache.stats()["rejected"] == 1
+	assert cache.stats()["disk_hits"] == 0
+	assert len(result.tokens) == 9
+
+
+@pytest.mark.skipif(os.name != "posix", reason="POSIX permissions")
+def test_shared_directory_is_refused(tmp_path):
+	directory = tmp_path / "shared"
+	directory.mkdir()
+	directory.chmod(0o777)
+	with pytest.raises(Exception):
+		ParseCache(directory=str(directory))
@@ -0,0 +1,20 @@
+from diagnostics import Diagnostics, Diagnostic, LEXER, PARSER, SEMANTIC
+from tokens import Token, TokenType
+
+
+def test_unprinted_entries():
+	diagnostics = Diagnostics(quiet=True)
+	diagnostics.lexer_error("S", 3, None)
+	diagnostics.parser_error("B", "true", 2, Token(TokenType.NULL))
+	assert len(diagnostics.entries) == 2
+	assert diagnostics.text() == ""
+
+
+def test_max_errors_counts_printed_entries():
+	diagnostics = Diagnostics(quiet=True, max_errors=2)
+	diagnostics.lexer_error("S", 1, None)
+	diagnostics.lexer_error("C", 2, "@")
+	diagnostics.add(Diagnostic(SEMANTIC, 3, "B", 3, TokenType.NUMBER, "<NUM, 012>"))
+	diagnostics.add(Diagnostic(PARSER, "V", None, 4, TokenType.COMMA, "<,>", "value"))
+	assert [entry.source for entry in diagnostics.entries] == [LEXER, LEXER, SEMANTIC]
+	assert diagnostics.dropped == 1
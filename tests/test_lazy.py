@@ -0,0 +1,33 @@
+import pytest
+
+from diagnostics import Diagnostics
+from lazy import lazy_text
+from parser import parse_text
+
+
+def test_path_skips_items_in_raw_text():
+	text = '{"skip": [1, "]", {"x": "}"}], "keep": {"list": [10, 20, 30]}}'
+	doc = lazy_text(text, diagnostics=Diagnostics(quiet=True))
+	node = doc["keep"]["list"][1]
+	assert node.token.value == "20"
+	# Only the containers on the path were scanned, "skip" was jumped over
+	assert doc.root.keys() == ["skip", "keep"]
+	assert doc["skip"].items is None
+	assert len(doc["keep"]["list"]) == 3
+
+
+def test_subtree_errors_numbered_like_full_parse():
+	text = '{"a": [1, 2], "b": [1, "x", 01]}'
+	full = Diagnostics(quiet=True)
+	parse_text(text, diagnostics=full)
+	lazy = Diagnostics(quiet=True)
+	lazy_text(text, diagnostics=lazy)["b"].parse()
+	key = lambda entries: [(entry.source, entry.code, entry.position) for entry in entries]
+	assert key(lazy.entries) == key(full.entries)
+	assert lazy.entries
+
+
+def test_unbalanced_container_on_path():
+	doc = lazy_text('{"a": [1, 2}, "b": 1}', diagnostics=Diagnostics(quiet=True))
+	with pytest.raises(Exception, match="Unbalanced"):
+		doc["b"]
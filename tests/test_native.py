@@ -0,0 +1,24 @@
+from diagnostics import Diagnostics
+from native import to_python
+
+
+def native(text):
+	return to_python(text, diagnostics=Diagnostics(quiet=True))
+
+
+def test_empty_containers():
+	assert native("{}") == {}
+	assert native("[]") == []
+	assert native('{"a": [], "b": {}}') == {"a": [], "b": {}}
+
+
+def test_trailing_comma():
+	assert native("[1,]") == [1]
+	assert native('{"a": 1,}') == {"a": 1}
+
+
+def test_missing_key_or_value():
+	assert native("[1,,2]") == [1, 2]
+	assert native('{"a":, "b": 2}') == {"b": 2}
+	assert native('{: 1}') == {}
+	assert native("") is None
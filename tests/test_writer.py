@@ -0,0 +1,38 @@
+from diagnostics import Diagnostics
+from parser import WRITE_CHARS, parse_text, write_tree
+
+
+# Output file that only keeps what is needed to check the output of a deep tree
+class CountingFile:
+	def __init__(self):
+		self.lines = 0
+		self.largest_write = 0
+		self.last_line = ""
+
+	def write(self, text):
+		self.lines += text.count("\n")
+		self.largest_write = max(self.largest_write, len(text))
+		self.last_line = text[text.rstrip("\n").rfind("\n") + 1:]
+
+
+def test_write_deep_tree():
+	depth = 5000
+	root = parse_text("[" * depth + "]" * depth, diagnostics=Diagnostics(quiet=True))
+	output_file = CountingFile()
+	write_tree(root, output_file)
+	# list, [ and ] on every level and the missing value in the innermost list
+	assert output_file.lines == 3 * depth + 1
+	assert output_file.last_line == "   ]\n"
+	# Writes are cut at WRITE_CHARS, plus the line that went over it
+	assert output_file.largest_write <= WRITE_CHARS + 3 * depth + 16
+
+
+def test_write_tree_indents():
+	output_file = CountingFile()
+	lines = []
+	output_file.write = lambda text: lines.append(text)
+	write_tree(parse_text('{"a": [1]}', diagnostics=Diagnostics(quiet=True)), output_file)
+	assert "".join(lines).splitlines() == [
+		"dict", "   {", "   pair", "      STRING: a", "      :", "      list",
+		"         [", "         value", "            NUMBER: 1", "         ]", "   }",
+	]
@@ -0,0 +1,171 @@
+# Token definitions shared by the scanner and the parser.
+# The scanner and the parser used to keep their own copies of these two classes, which
+# disagreed on the values for true/false. Both now import them from here.
+from array import array
+
+# Token types
+class TokenType:
+	STRING = 'STRING'  # String datatype
+	NUMBER = 'NUMBER'  # numeric datatype
+	EOF = 'EOF'  # End of file(End of input)
+	NULL = 'NULL'  # 'null'
+	FALSE = 'FALSE'  # 'false'
+	TRUE = 'TRUE'  # 'true'
+
+	# Other types of tokens
+	LBRACE = 'LBRACE'  # '{'
+	RBRACE = 'RBRACE'  # '}'
+	LBRACKET = 'LBRACKET'  # '['
+	RBRACKET = 'RBRACKET'  # ']'
+	COMMA = 'COMMA'  # ','
+	COLON = 'COLON'  # ':'
+	SEMICOLON = 'SEMICOLON'  # ';'
+
+
+# Defining tokens
+class Token:
+
+	def __init__(self, type_, value=None):
+		self.type = type_
+		self.value = value
+
+	def __repr__(self):
+		# Recognize string, number, booleans and all other characters relevant in JSON
+		# This is also the format of the token file, see README
+		if self.type == TokenType.STRING:
+			return f"<STR, {self.value}>"
+		elif self.type == TokenType.NUMBER:
+			return f"<NUM, {self.value}>"
+		elif self.type == TokenType.LBRACE:
+			return "<{>"
+		elif self.type == TokenType.RBRACE:
+			return "<}>"
+		elif self.type == TokenType.LBRACKET:
+			return "<[>"
+		elif self.type == TokenType.RBRACKET:
+			return "<]>"
+		elif self.type == TokenType.COMMA:
+			return "<,>"
+		elif self.type == TokenType.COLON:
+			return "<:>"
+		elif self.type == TokenType.SEMICOLON:
+			return "<;>"
+		elif self.type == TokenType.TRUE:
+			return "<true>"
+		elif self.type == TokenType.FALSE:
+			return "<false>"
+		elif self.type == TokenType.NULL:
+			return "<NULL>"
+		elif self.type == TokenType.EOF:
+			return "<EOF>"
+		else:
+			return f"<{self.type}>"
+
+
+# Binary token file format (see scanner.write_binary_tokens and parser.read_binary_tokens):
+# the header BINARY_MAGIC followed by one version byte, then for every token one type byte from TYPE_CODES.
+# STRING and NUMBER tokens are followed by the length of their utf-8 value (one byte, or 255 and
+# then 8 bytes little endian for long values) and the value itself.
+BINARY_MAGIC = b"TOKB"
+BINARY_VERSION = 1
+LONG_LENGTH = 255
+TYPE_CODES = {
+	TokenType.STRING: 1,
+	TokenType.NUMBER: 2,
+	TokenType.NULL: 3,
+	TokenType.FALSE: 4,
+	TokenType.TRUE: 5,
+	TokenType.LBRACE: 6,
+	TokenType.RBRACE: 7,
+	TokenType.LBRACKET: 8,
+	TokenType.RBRACKET: 9,
+	TokenType.COMMA: 10,
+	TokenType.COLON: 11,
+	TokenType.SEMICOLON: 12,
+	TokenType.EOF: 13,
+}
+CODE_TYPES = {code: type_ for type_, code in TYPE_CODES.items()}
+
+
+# Write tokens in the text format of the README, one per line (debug dump of the token stream)
+def dump_tokens(tokens, output_file, echo=False):
+	for token in tokens:
+		print(token, file=output_file)
+		if echo:
+			print(token)
+		yield token
+
+
+# Length in the input of the tokens without a value
+TOKEN_LENGTHS = {
+	TokenType.TRUE: 4,
+	TokenType.FALSE: 5,
+	TokenType.NULL: 4,
+	TokenType.LBRACE: 1,
+	TokenType.RBRACE: 1,
+	TokenType.LBRACKET: 1,
+	TokenType.RBRACKET: 1,
+	TokenType.COMMA: 1,
+	TokenType.COLON: 1,
+	TokenType.SEMICOLON: 1,
+}
+
+
+# Number of characters the token takes up in the input
+def token_length(token):
+	if token.type == TokenType.STRING:
+		return len(token.value) + 2
+	if token.type == TokenType.NUMBER:
+		return len(token.value)
+	return TOKEN_LENGTHS[token.type]
+
+
+# Token stream stored as offsets into the input instead of Token objects: per token one type byte (TYPE_CODES) and
+# the start and end of its value in buffer (the whole token for tokens without a value), in flat arrays.
+# buffer is the input text, or a bytes-like object (bytes, mmap) holding ASCII input so that character positions
+# are byte positions. Values are only sliced out (and decoded) when a token is looked at, indexing or iterating
+# gives ordinary Tokens.
+class PackedTokens:
+	def __init__(self, buffer):
+		self.buffer = buffer
+		self.types = array("b")
+		self.starts = array("q")
+		self.ends = array("q")
+	
+	def append(self, type_, start, end):
+		self.types.append(TYPE_CODES[type_])
+		self.starts.append(start)
+		self.ends.append(end)
+	
+	def __len__(self):
+		return len(self.types)
+	
+	def type_at(self, i):
+		return CODE_TYPES[self.types[i]]
+	
+	# Value of token i, None for tokens without one
+	def value_at(self, i):
+		type_ = CODE_TYPES[self.types[i]]
+		if type_ != TokenType.STRING and type_ != TokenType.NUMBER:
+			return None
+		value = self.buffer[self.starts[i]:self.ends[i]]
+		return value if isinstance(value, str) else value.decode("ascii")
+	
+	def __getitem__(self, i):
+		if isinstance(i, slice):
+			return [self[j] for j in range(*i.indices(len(self.types)))]
+		if i < 0:
+			i += len(self.types)
+		return Token(CODE_TYPES[self.types[i]], self.value_at(i))
+	
+	def __iter__(self):
+		for i in range(len(self.types)):
+			yield self[i]
+	
+	# Types of all tokens in order, without making Tokens
+	def token_types(self):
+		return map(CODE_TYPES.__getitem__, self.types)
+	
+	# Bytes used by the arrays (the buffer is not counted)
+	def nbytes(self):
+		return sum(len(values) * values.itemsize for values in (self.types, self.starts, self.ends))